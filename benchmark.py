@@ -0,0 +1,368 @@
+# benchmark for import.py, runs without blender or any game files.
+# it writes synthetic .dat files in the same layout the importer reads, then times each stage of the import separately.
+# construction runs against a small stand in for bpy that just takes the arrays, so that part measures our side of the work only.
+#
+#   python benchmark.py --verts 200000 --stride 28 --index-width 3 --meshes 40 --parts 4
+#   python benchmark.py --skinned --bones 60 --json results.json
+#   python benchmark.py --compare results.json --tolerance 1.25   (exits with 1 if any stage got slower than that)
+import argparse
+import importlib.util
+import json
+import os
+import statistics
+import struct
+import sys
+import tempfile
+import time
+import types
+import numpy as np
+
+
+# ---- synthetic model files ----
+
+def pack_string(text): return text.encode('utf-8') + b'\x00'
+
+def pack_bounds(rng):
+    low = rng.uniform(-50.0, 0.0, 3)
+    high = low + rng.uniform(1.0, 50.0, 3)
+    return struct.pack('>8f', low[0], low[1], low[2], 0.0, high[0], high[1], high[2], 0.0)
+
+def pack_header():
+    return struct.pack('>i', 2) + pack_string("synthetic_model") + struct.pack('>I', 1) + pack_string("synthetic_layout") + struct.pack('>I', 2)
+
+# splits vert_count vertices and their triangles evenly over the meshes and parts
+def layout_parts(vert_count, mesh_count, part_count, triangles_per_vert):
+    meshes = []
+    total_parts = mesh_count * part_count
+    verts_per_part = max(3, vert_count // total_parts)
+    vert_index = 0
+    index_offset = 0
+    for mesh_index in range(mesh_count):
+        mesh = {"name": "mesh_" + str(mesh_index), "first": vert_index, "indices_offset": index_offset, "parts": []}
+        for part_index in range(part_count):
+            triangle_count = max(1, int(verts_per_part * triangles_per_vert))
+            mesh["parts"].append({"label": "material_" + str(part_index % 8), "first": vert_index, "last": vert_index + verts_per_part - 1,
+                                  "indices_offset": index_offset, "triangles": triangle_count})
+            vert_index += verts_per_part
+            index_offset += triangle_count * 3
+        mesh["vert_count"] = vert_index - mesh["first"]
+        meshes.append(mesh)
+    return meshes, vert_index, index_offset
+
+def pack_vertices(rng, vert_count, stride, has_color, skinned, bone_count):
+    layout = {'names': ['x', 'y', 'z', 'n_x', 'n_y', 'uv_x', 'uv_y'], 'formats': ['>f4', '>f4', '>f4', '>u4', '>u4', '>f2', '>f2'],
+              'offsets': [0x00, 0x04, 0x08, 0x0C, 0x10, 0x14, 0x16], 'itemsize': stride}
+    if has_color: layout['names'].append('color'); layout['formats'].append('>u4'); layout['offsets'].append(0x18)
+    if skinned:
+        layout['names'] += ['bone_weights', 'bone_indices']; layout['formats'] += ['>u4', '>u4']; layout['offsets'] += [0x18, 0x1C]
+    verts = np.zeros(vert_count, dtype=np.dtype(layout))
+    for name in ('x', 'y', 'z'): verts[name] = rng.uniform(-50.0, 50.0, vert_count)
+    for name in ('n_x', 'n_y', 'color', 'bone_weights'):
+        if name in verts.dtype.names: verts[name] = rng.integers(0, 2**32, vert_count, dtype=np.uint64)
+    for name in ('uv_x', 'uv_y'): verts[name] = rng.uniform(0.0, 1.0, vert_count)
+    if skinned:
+        bones = rng.integers(0, bone_count, (vert_count, 4), dtype=np.uint64)
+        verts['bone_indices'] = bones[:, 0] | (bones[:, 1] << 8) | (bones[:, 2] << 16) | (bones[:, 3] << 24)
+    return struct.pack('>ii', stride, stride * vert_count) + verts.tobytes()
+
+index_widths = {3: '>u4', 2: '>u2', 1: 'u1'}
+def pack_indices(rng, meshes, index_count, index_width):
+    indices = np.zeros(index_count, dtype=np.int64)
+    for mesh in meshes:
+        for part in mesh["parts"]:
+            start = part["indices_offset"]
+            indices[start:start + part["triangles"]*3] = rng.integers(part["first"], part["last"] + 1, part["triangles"]*3)
+    if indices.max(initial=0) >= 2**(8*np.dtype(index_widths[index_width]).itemsize):
+        raise ValueError("too many vertices for " + str(index_width) + " byte wide indices")
+    data = indices.astype(index_widths[index_width]).tobytes()
+    return struct.pack('>II', len(data), index_width) + data
+
+def pack_mesh_table(rng, meshes):
+    result = struct.pack('>II', 0, len(meshes))
+    for mesh in meshes:
+        result += pack_string(mesh["name"]) + struct.pack('>I', 1) + struct.pack('>4I', 0, 1, 2, 3)
+        result += struct.pack('>I', len(mesh["parts"]))
+        for part in mesh["parts"]:
+            result += pack_string(part["label"]) + struct.pack('>4I', part["first"], part["last"], part["indices_offset"], part["triangles"]) + pack_bounds(rng)
+        result += pack_bounds(rng) + struct.pack('>3I', mesh["first"], mesh["indices_offset"], mesh["vert_count"])
+    return result
+
+# the coord data blocks the importer searches for, each one sits right before the name of its mesh
+def pack_coord_blocks(rng, meshes):
+    result = b'synthetic tail'
+    for mesh in meshes:
+        matrix = np.eye(4)
+        matrix[:3, 3] = rng.uniform(-100.0, 100.0, 3)
+        result += bytes(16) + struct.pack('>16f', *matrix.ravel()) + pack_bounds(rng) + b'\x00' + pack_string(mesh["name"])
+    return result
+
+def pack_bones(rng, bone_count):
+    result = struct.pack('>I', bone_count)
+    for bone_index in range(bone_count): result += ("bone_" + str(bone_index)).encode('utf-8').ljust(32, b'\x00')
+    for bone_index in range(bone_count): result += struct.pack('>i', bone_index - 1)
+    for bone_index in range(bone_count): result += struct.pack('>3fI7fI', *rng.uniform(-1.0, 1.0, 3), 0, 0.0, 0.0, 0.0, 1.0, 1.0, 1.0, 1.0, 0)
+    return result + struct.pack('>8f', *rng.uniform(-1.0, 1.0, 8))
+
+def write_model(path, vert_count = 10000, stride = 24, has_color = False, index_width = 2, mesh_count = 4, part_count = 2,
+                skinned = False, bone_count = 0, triangles_per_vert = 1.5, seed = 0):
+    if skinned and stride < 32: raise ValueError("skinned vertices need a stride of at least 32")
+    if has_color and stride < 28: raise ValueError("vertex colors need a stride of at least 28")
+    rng = np.random.default_rng(seed)
+    meshes, vert_count, index_count = layout_parts(vert_count, mesh_count, part_count, triangles_per_vert)
+    with open(path, "wb") as out:
+        out.write(pack_header())
+        if skinned: out.write(pack_bones(rng, max(1, bone_count)))
+        out.write(pack_vertices(rng, vert_count, stride, has_color, skinned, max(1, bone_count)))
+        out.write(pack_indices(rng, meshes, index_count, index_width))
+        out.write(pack_mesh_table(rng, meshes))
+        out.write(pack_coord_blocks(rng, meshes))
+    return vert_count, index_count
+
+
+# ---- stand in for bpy ----
+
+# just enough of the bpy api for the construction code, collections keep whatever arrays get set on them
+class stub_collection:
+    def __init__(self): self.count = 0; self.values = {}
+    def add(self, count): self.count += count
+    def foreach_set(self, name, values): self.values[name] = np.asarray(values)
+    def __len__(self): return self.count
+
+class stub_layer:
+    def __init__(self): self.data = stub_collection()
+
+class stub_layers(list):
+    active = None
+    def new(self, name = ""):
+        self.append(stub_layer())
+        return self[-1]
+
+class stub_mesh:
+    def __init__(self, name = ""):
+        self.name = name
+        self.vertices = stub_collection(); self.edges = stub_collection(); self.loops = stub_collection(); self.polygons = stub_collection()
+        self.uv_layers = stub_layers(); self.vertex_colors = stub_layers(); self.attributes = stub_layers()
+        self.materials = []
+        self.normals = None
+        self.use_auto_smooth = False
+    def update(self, calc_edges = False): pass
+    def validate(self, verbose = False): return False
+    def normals_split_custom_set_from_vertices(self, normals): self.normals = np.asarray(normals)
+    def normals_split_custom_set(self, normals): self.normals = np.asarray(normals)
+
+class stub_vertex_group:
+    def __init__(self, name): self.name = name; self.count = 0
+    def add(self, indices, weight, mode): self.count += len(indices)
+
+class stub_vertex_groups(list):
+    def new(self, name = ""):
+        self.append(stub_vertex_group(name))
+        return self[-1]
+
+class stub_modifiers(list):
+    def new(self, name, type):
+        self.append(types.SimpleNamespace(name=name, type=type, object=None))
+        return self[-1]
+
+class stub_object:
+    def __init__(self, name, data):
+        self.name = name
+        self.data = data
+        self.matrix_world = np.eye(4)
+        self.location = np.zeros(3)
+        self.display_type = 'SOLID'
+        self.modifiers = stub_modifiers()
+        self.vertex_groups = stub_vertex_groups()
+        self.material_slots = []
+    def select_set(self, state): pass
+
+class stub_edit_bones(list):
+    active = None
+    def new(self, name):
+        self.append(types.SimpleNamespace(name=name, head=None, tail=None, parent=None, use_connect=False, select=False))
+        return self[-1]
+
+class stub_datablocks(dict):
+    def __init__(self, factory): super().__init__(); self.factory = factory
+    def new(self, name, *args):
+        block = self.factory(name, *args)
+        self[name + "." + str(len(self))] = block
+        return block
+    def remove(self, block): pass
+
+def make_bpy_stub():
+    def prop(*args, **kwargs): return None
+    class stub_class: pass
+    bpy = types.ModuleType("bpy")
+    bpy.app = types.SimpleNamespace(background=True, version=(3, 6, 0))
+    bpy.data = types.SimpleNamespace(
+        meshes=stub_datablocks(stub_mesh),
+        objects=stub_datablocks(stub_object),
+        materials=stub_datablocks(lambda name: types.SimpleNamespace(name=name)),
+        armatures=stub_datablocks(lambda name: types.SimpleNamespace(name=name, edit_bones=stub_edit_bones())))
+    bpy.context = types.SimpleNamespace(collection=types.SimpleNamespace(objects=types.SimpleNamespace(link=lambda obj: None)),
+                                        view_layer=types.SimpleNamespace(objects=types.SimpleNamespace(active=None)))
+    bpy.ops = types.SimpleNamespace(object=types.SimpleNamespace(mode_set=prop, select_all=prop))
+    bpy.utils = types.SimpleNamespace(register_class=prop, unregister_class=prop)
+    bpy.types = types.ModuleType("bpy.types")
+    for name in ("Operator", "PropertyGroup", "UIList", "OperatorFileListElement"): setattr(bpy.types, name, type(name, (stub_class,), {}))
+    bpy.types.TOPBAR_MT_file_import = types.SimpleNamespace(append=prop, remove=prop)
+    bpy.props = types.ModuleType("bpy.props")
+    for name in ("StringProperty", "BoolProperty", "EnumProperty", "IntProperty", "FloatProperty", "CollectionProperty", "PointerProperty"):
+        setattr(bpy.props, name, prop)
+    bpy_extras = types.ModuleType("bpy_extras")
+    bpy_extras.io_utils = types.ModuleType("bpy_extras.io_utils")
+    bpy_extras.io_utils.ImportHelper = type("ImportHelper", (), {})
+    mathutils = types.ModuleType("mathutils")
+    mathutils.Matrix = lambda rows: np.array(rows, dtype=float)
+    mathutils.Vector = lambda values: np.array(values, dtype=float)
+    return {"bpy": bpy, "bpy.types": bpy.types, "bpy.props": bpy.props, "bpy_extras": bpy_extras, "bpy_extras.io_utils": bpy_extras.io_utils, "mathutils": mathutils}
+
+def load_importer(with_bpy_stub = True):
+    saved = {}
+    if with_bpy_stub:
+        for name, module in make_bpy_stub().items():
+            saved[name] = sys.modules.get(name)
+            sys.modules[name] = module
+    try:
+        spec = importlib.util.spec_from_file_location("hydro_thunder_import", os.path.join(os.path.dirname(os.path.abspath(__file__)), "import.py"))
+        module = importlib.util.module_from_spec(spec)
+        sys.modules[spec.name] = module
+        spec.loader.exec_module(module)
+    finally:
+        for name, previous in saved.items():
+            if previous is None: sys.modules.pop(name, None)
+            else: sys.modules[name] = previous
+    return module
+
+
+# ---- timing ----
+
+# best and median of repeat runs, in seconds
+def time_stage(function, repeat):
+    times = []
+    for i in range(repeat):
+        start = time.perf_counter()
+        function()
+        times.append(time.perf_counter() - start)
+    return min(times), statistics.median(times)
+
+class quiet_output:
+    def __enter__(self):
+        self.stdout = sys.stdout
+        sys.stdout = open(os.devnull, "w")
+    def __exit__(self, *args):
+        sys.stdout.close()
+        sys.stdout = self.stdout
+
+# offsets of the sections in a file written by write_model
+def find_sections(importer, path, skinned):
+    sections = {}
+    with importer.model_reader(path) as f:
+        importer.read_model_header(f)
+        if skinned:
+            bone_count = f.read_uint()
+            f.skip(bone_count * (32 + 4 + 48) + 32)
+        sections["vertices"] = f.tell()
+        stride = f.read_int()
+        vert_count = f.read_int() // stride
+        f.skip(stride * vert_count)
+        sections["indices"] = f.tell()
+        importer.read_model_indices(f)
+        sections["mesh table"] = f.tell()
+        importer.read_model_mesh(f)
+        sections["tail"] = f.tell()
+    return sections
+
+def run_benchmark(path, skinned, repeat):
+    importer = load_importer()
+    sections = find_sections(importer, path, skinned)
+    results = {}
+
+    def read_section(offset, read):
+        with importer.model_reader(path) as f:
+            f.seek(offset)
+            return read(f)
+    def read_vertices(f):
+        stride = f.read_int()
+        vert_count = f.read_int() // stride
+        return importer.read_vertex_buffer(f, importer.find_vertex_layout(header, skinned, stride), vert_count)
+    meshes = read_section(sections["mesh table"], importer.read_model_mesh)
+    header = read_section(0, importer.read_model_header)
+    def read_coords(f):
+        for offset in importer.index_model_coords(f, meshes, sections["tail"]):
+            f.seek(offset)
+            importer.read_model_coords(f)
+
+    stages = [
+        ("header",      lambda: read_section(0, importer.read_model_header)),
+        ("vertices",    lambda: read_section(sections["vertices"], read_vertices)),
+        ("indices",     lambda: read_section(sections["indices"], importer.read_model_indices)),
+        ("mesh table",  lambda: read_section(sections["mesh table"], importer.read_model_mesh)),
+        ("coord data",  lambda: read_section(sections["tail"], read_coords)),
+        ("scan",        lambda: importer.scan_model(path, skinned)),
+        ("full parse",  lambda: importer.parse_model(path, skinned)),
+    ]
+    with quiet_output():
+        model = importer.parse_model(path, skinned)
+    if skinned: stages.append(("construct", lambda: importer.construct_rigged_model(model)))
+    else: stages.append(("construct", lambda: importer.construct_static_model(model)))
+
+    with quiet_output():
+        for name, function in stages:
+            results[name] = time_stage(function, repeat)
+    return results
+
+def main(argv):
+    parser = argparse.ArgumentParser(description="Time the stages of import.py on a synthetic .dat file")
+    parser.add_argument("--verts", type=int, default=100000)
+    parser.add_argument("--stride", type=int, help="vertex stride in bytes (default 24, 28 with --color, 32 with --skinned)")
+    parser.add_argument("--color", action="store_true", help="add a vertex color word (static models only)")
+    parser.add_argument("--index-width", type=int, choices=(1, 2, 3), default=3, help="3 = 4 byte, 2 = 2 byte, 1 = 1 byte indices")
+    parser.add_argument("--meshes", type=int, default=16)
+    parser.add_argument("--parts", type=int, default=4, help="parts per mesh")
+    parser.add_argument("--skinned", action="store_true")
+    parser.add_argument("--bones", type=int, default=32)
+    parser.add_argument("--repeat", type=int, default=5)
+    parser.add_argument("--keep", metavar="PATH", help="write the synthetic file here and keep it")
+    parser.add_argument("--json", metavar="PATH", help="write the results to a json file")
+    parser.add_argument("--compare", metavar="PATH", help="json results of an earlier run to compare against")
+    parser.add_argument("--tolerance", type=float, default=1.25, help="how much slower a stage may get before --compare fails")
+    args = parser.parse_args(argv)
+
+    stride = args.stride or (32 if args.skinned else 28 if args.color else 24)
+    path = args.keep or os.path.join(tempfile.mkdtemp(), "synthetic.dat")
+    vert_count, index_count = write_model(path, args.verts, stride, args.color and not args.skinned, args.index_width,
+                                          args.meshes, args.parts, args.skinned, args.bones)
+    print(os.path.basename(path) + ": " + str(vert_count) + " verts, stride " + str(stride) + ", " + str(index_count//3) + " triangles, "
+          + str(args.meshes) + "x" + str(args.parts) + " parts" + (", " + str(args.bones) + " bones" if args.skinned else ""))
+    try:
+        results = run_benchmark(path, args.skinned, args.repeat)
+    finally:
+        if not args.keep: os.remove(path)
+
+    baseline = None
+    if args.compare:
+        with open(args.compare) as file: baseline = json.load(file)["stages"]
+    failed = []
+    print("%-12s %10s %10s %s" % ("stage", "best ms", "median ms", "vs baseline" if baseline else ""))
+    for name, (best, median) in results.items():
+        line = "%-12s %10.2f %10.2f" % (name, best * 1000.0, median * 1000.0)
+        if baseline and name in baseline:
+            ratio = best / max(baseline[name]["best"], 1e-9)
+            line += "  %.2fx" % ratio
+            if ratio > args.tolerance: failed.append(name)
+        print(line)
+
+    if args.json:
+        with open(args.json, "w") as file:
+            json.dump({"file": {"verts": vert_count, "triangles": index_count//3, "stride": stride, "index_width": args.index_width,
+                                "meshes": args.meshes, "parts": args.parts, "skinned": args.skinned, "bones": args.bones},
+                       "stages": {name: {"best": best, "median": median} for name, (best, median) in results.items()}}, file, indent=1)
+    if failed:
+        print("slower than the baseline: " + ", ".join(failed))
+        return 1
+    return 0
+
+if __name__ == "__main__":
+    sys.exit(main(sys.argv[1:]))
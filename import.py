@@ -1,237 +1,460 @@
-import bpy
-import bmesh
 import struct
 import math
 import os
-from bpy.props import StringProperty, BoolProperty, EnumProperty, CollectionProperty
-import mathutils
-from mathutils import Matrix
+import sys
+import mmap
+import json
+import hashlib
+import tempfile
+import pickle
+import argparse
+import time
+import tracemalloc
+import contextlib
+import concurrent.futures
+import numpy as np
+# the parsing side only needs numpy, so this file also runs outside of blender as a batch converter (see convert_main)
+try:
+    import bpy
+    from bpy.props import StringProperty, BoolProperty, EnumProperty, CollectionProperty
+    import mathutils
+    from mathutils import Matrix
+except ImportError:
+    bpy = None
+
+
+# ---- profiling ----
+
+# wall time, call count and (with trace_memory) the tracemalloc peak of each import stage.
+# stages dont nest, every part of a file adds into the same few entries
+class import_profile:
+    def __init__(self, trace_memory = False):
+        self.trace_memory = trace_memory
+        self.stages = {} # name -> [seconds, calls, peak bytes above what was allocated when the stage started]
+
+    def add(self, name, seconds, calls = 1, peak = 0):
+        entry = self.stages.setdefault(name, [0.0, 0, 0])
+        entry[0] += seconds
+        entry[1] += calls
+        entry[2] = max(entry[2], peak)
+
+    def merge(self, other):
+        for name, (seconds, calls, peak) in other.stages.items(): self.add(name, seconds, calls, peak)
+        self.trace_memory = self.trace_memory or other.trace_memory
+
+    def total(self): return sum(entry[0] for entry in self.stages.values())
+
+    # slowest stages first
+    def table(self):
+        lines = ["%-12s %6s %10s" % ("stage", "calls", "total ms") + (" %9s" % "peak MB" if self.trace_memory else "")]
+        for name, (seconds, calls, peak) in sorted(self.stages.items(), key=lambda item: -item[1][0]):
+            lines.append("%-12s %6d %10.2f" % (name, calls, seconds*1000.0) + (" %9.2f" % (peak / 1024**2) if self.trace_memory else ""))
+        lines.append("%-12s %6s %10.2f" % ("total", "", self.total()*1000.0))
+        return "\n".join(lines)
+
+    def to_json(self):
+        return {name: {"seconds": seconds, "calls": calls, "peak_bytes": peak} for name, (seconds, calls, peak) in self.stages.items()}
+
+# the profile that profile_stage records into, None when nothing is being profiled
+active_profile = None
+
+class timed_stage:
+    def __init__(self, profile, name):
+        self.profile = profile
+        self.name = name
+    def __enter__(self):
+        self.trace = self.profile.trace_memory and tracemalloc.is_tracing()
+        if self.trace:
+            self.base = tracemalloc.get_traced_memory()[0]
+            tracemalloc.reset_peak()
+        self.start = time.perf_counter()
+    def __exit__(self, *args):
+        seconds = time.perf_counter() - self.start
+        peak = tracemalloc.get_traced_memory()[1] - self.base if self.trace else 0
+        self.profile.add(self.name, seconds, 1, peak)
+
+no_stage = contextlib.nullcontext()
+def profile_stage(name):
+    if active_profile is None: return no_stage
+    return timed_stage(active_profile, name)
+
+# makes profile the active one for the stages run inside it, and starts tracemalloc for the time if the profile wants memory
+@contextlib.contextmanager
+def profiling(profile):
+    global active_profile
+    previous = active_profile
+    start_tracing = profile is not None and profile.trace_memory and not tracemalloc.is_tracing()
+    if start_tracing: tracemalloc.start()
+    active_profile = profile
+    try: yield profile
+    finally:
+        active_profile = previous
+        if start_tracing: tracemalloc.stop()
 
 model_header_size = 24
+# the records below use __slots__ and set their defaults per instance, a level can have thousands of them.
+# (they used to be class attributes, so every mesh shared the same parts list and bounds until they got reassigned)
 class model_header_signature:
-    signature = ""
-    unk = 0
+    __slots__ = ('signature', 'unk')
+    def __init__(self, signature = "", unk = 0):
+        self.signature = signature
+        self.unk = unk
 class model_header:
-    sig_count = 0             
-    signatures = []
-
-model_vertex_size = 24
-class model_vertex:
-    x = 0.0     # 0x00, float
-    y = 0.0     # 0x04, float
-    z = 0.0     # 0x08, float
-    n_x = 0.0   # 0x0C, uint
-    n_y = 0.0   # 0x10, uint
-    uv_x = 0.0  # 0x14, float16
-    uv_y = 0.0  # 0x16, float16
-    color = None
+    __slots__ = ('sig_count', 'signatures')
+    def __init__(self):
+        self.sig_count = 0
+        self.signatures = []
+
+# (name, format, offset) of each vertex field
+base_vertex_fields = (('x', '>f4', 0x00), ('y', '>f4', 0x04), ('z', '>f4', 0x08), ('n_x', '>u4', 0x0C), ('n_y', '>u4', 0x10), ('uv_x', '>f2', 0x14), ('uv_y', '>f2', 0x16))
+color_vertex_fields = base_vertex_fields + (('color', '>u4', 0x18),)
+skinned_vertex_fields = base_vertex_fields + (('bone_weights', '>u4', 0x18), ('bone_indices', '>u4', 0x1C))
+
+# one vertex format, compiled to a numpy dtype once and then reused for every file that has it
+class vertex_layout:
+    __slots__ = ('name', 'stride', 'skinned', 'signature', 'fields', 'dtype')
+    def __init__(self, name, stride, fields, skinned = False, signature = None):
+        self.name = name
+        self.stride = stride
+        self.skinned = skinned
+        self.signature = signature # header signature this layout is for, None for any file
+        self.fields = fields
+        # itemsize takes care of any padding at the end of each vertex
+        self.dtype = np.dtype({'names': [field[0] for field in fields], 'formats': [field[1] for field in fields],
+                               'offsets': [field[2] for field in fields], 'itemsize': stride})
+    def has(self, field): return field in self.dtype.names
+
+# (signature, skinned, stride) -> vertex_layout
+vertex_layouts = {}
+def register_vertex_layout(layout): vertex_layouts[(layout.signature, layout.skinned, layout.stride)] = layout
+
+register_vertex_layout(vertex_layout("static", 24, base_vertex_fields))
+register_vertex_layout(vertex_layout("static with colors", 28, color_vertex_fields))
+register_vertex_layout(vertex_layout("skinned", 32, skinned_vertex_fields, skinned=True))
+
+# a layout registered for one of the files signatures wins over the general ones. strides nobody registered are read with
+# the largest known layout that fits and the rest of each vertex skipped, that layout gets registered so the next file reuses it
+def find_vertex_layout(header, skinned, stride):
+    for signature in header.signatures:
+        layout = vertex_layouts.get((signature.signature, skinned, stride))
+        if layout is not None: return layout
+    layout = vertex_layouts.get((None, skinned, stride))
+    if layout is not None: return layout
+
+    known = [layout for (signature, layout_skinned, layout_stride), layout in vertex_layouts.items() if signature is None and layout_skinned == skinned and layout_stride < stride]
+    if len(known) == 0: raise Exception("vertex stride is smaller than regular size (we'll lose vertex data)")
+    base = max(known, key=lambda layout: layout.stride)
+    layout = vertex_layout(base.name + " + " + str(stride - base.stride) + " unknown bytes", stride, base.fields, skinned)
+    print("unknown vertex stride " + str(stride) + ", reading it as " + layout.name)
+    register_vertex_layout(layout)
+    return layout
+
+# all the vertex data of a file, one array per attribute
+class vertex_buffer:
+    __slots__ = ('count', 'positions', 'normals', 'uvs', 'colors', 'bone_weights', 'bone_indices')
+    def __init__(self):
+        self.count = 0
+        self.positions = None    # (N,3) float32
+        self.normals = None      # (N,3) float32, decoded once per file (see decode_normals)
+        self.uvs = None          # (N,2) float32
+        self.colors = None       # (N,4) float32 RGBA, decoded once per file. None if the file has no vertex colors
+        self.bone_weights = None # (N,) uint32, None for static models
+        self.bone_indices = None # (N,) uint32, None for static models
 
 
 class model_mesh_unk:
-    unk1 = 0 # uint
-    unk2 = 0 # uint
-    unk3 = 0 # uint
-    unk4 = 0 # uint, larger number? flags?
+    __slots__ = ('unk1', 'unk2', 'unk3', 'unk4')
+    def __init__(self, unk1 = 0, unk2 = 0, unk3 = 0, unk4 = 0):
+        self.unk1 = unk1 # uint
+        self.unk2 = unk2 # uint
+        self.unk3 = unk3 # uint
+        self.unk4 = unk4 # uint, larger number? flags?
 
 class object_bounds:
-    min_x = 0.0
-    min_y = 0.0
-    min_z = 0.0
-    yaw = 0.0
-    max_x = 0.0
-    max_y = 0.0
-    max_z = 0.0
-    pitch = 0.0
+    __slots__ = ('min_x', 'min_y', 'min_z', 'yaw', 'max_x', 'max_y', 'max_z', 'pitch')
+    def __init__(self, min_x = 0.0, min_y = 0.0, min_z = 0.0, yaw = 0.0, max_x = 0.0, max_y = 0.0, max_z = 0.0, pitch = 0.0):
+        self.min_x = min_x
+        self.min_y = min_y
+        self.min_z = min_z
+        self.yaw = yaw
+        self.max_x = max_x
+        self.max_y = max_y
+        self.max_z = max_z
+        self.pitch = pitch
 
 class model_mesh_part:
-    label = ""
-    first_vert_index = 0
-    last_vert_index = 0 
-    indices_offset = 0 
-    triangles_count = 0
-    bounds = object_bounds()
+    __slots__ = ('label', 'first_vert_index', 'last_vert_index', 'indices_offset', 'triangles_count', 'bounds')
+    def __init__(self):
+        self.label = ""
+        self.first_vert_index = 0
+        self.last_vert_index = 0
+        self.indices_offset = 0
+        self.triangles_count = 0
+        self.bounds = object_bounds()
 
 class model_mesh:
-    name = "" # 0x00, 66bytes
-    unk_count = 0
-    unkers = []
-    part_count = 0
-    parts = []
-    bounds = object_bounds()
-    first_vert_index = 0
-    indices_offset = 0
-    vert_count = 0 
+    __slots__ = ('name', 'unk_count', 'unkers', 'part_count', 'parts', 'bounds', 'first_vert_index', 'indices_offset', 'vert_count')
+    def __init__(self):
+        self.name = "" # 0x00, 66bytes
+        self.unk_count = 0
+        self.unkers = []
+        self.part_count = 0
+        self.parts = []
+        self.bounds = object_bounds()
+        self.first_vert_index = 0
+        self.indices_offset = 0
+        self.vert_count = 0
 
 class model_coord_data:
-    name = ""
-    unk = 0
-    label = ""
-    matrix_1 = 0.0
-    matrix_2 = 0.0
-    matrix_3 = 0.0
-    matrix_4 = 0.0
-    matrix_5 = 0.0
-    matrix_6 = 0.0
-    matrix_7 = 0.0
-    matrix_8 = 0.0
-    matrix_9 = 0.0
-    matrix_10 = 0.0
-    matrix_11 = 0.0
-    matrix_12 = 0.0
-    matrix_13 = 0.0
-    matrix_14 = 0.0
-    matrix_15 = 0.0
-    matrix_16 = 0.0
-    bounds = object_bounds()
+    __slots__ = ('matrix', 'bounds')
+    def __init__(self):
+        self.matrix = np.eye(4, dtype=np.float32) # 4x4, as stored in the file (row major, translation in the last column)
+        self.bounds = object_bounds()
+
 
+# the fixed size records, each one gets read with a single unpack_from
+bounds_struct = struct.Struct('>8f')
+mesh_unk_struct = struct.Struct('>4I')
+part_struct = struct.Struct('>4I8f')       # first/last vert index, indices offset, triangle count, then the bounds
+mesh_tail_struct = struct.Struct('>8f3I')  # bounds, then first vert index, indices offset, vert count
+coords_struct = struct.Struct('>16f8f')    # matrix, then the bounds
+mesh_table_struct = struct.Struct('>4xI')  # unknown int, mesh count
+bone_tail_struct = struct.Struct('>8f')    # 8 unknown position floats after the bones
 
 def read_bounds(f):
-    result = object_bounds()
-    result.min_x = read_float(f)
-    result.min_y = read_float(f)
-    result.min_z = read_float(f)
-    result.yaw   = read_float(f)
-    result.max_x = read_float(f)
-    result.max_y = read_float(f)
-    result.max_z = read_float(f)
-    result.pitch = read_float(f)
-    return result
+    return object_bounds(*f.read_struct(bounds_struct))
 
 def read_model_mesh(f):
-    f.read(4) # this int is unknown for now
-    meshes_count = read_uint(f)
+    meshes_count, = f.read_struct(mesh_table_struct) # the int before the count is unknown for now
     meshes = []
     for i in range(0, meshes_count):
         mesh = model_mesh()
-        mesh.name = read_string(f)
-        mesh.unk_count = read_uint(f)
-        mesh.unkers = []
-        for js in range(0, mesh.unk_count):
-            unker = model_mesh_unk()
-            unker.unk1 = read_uint(f)
-            unker.unk2 = read_uint(f)
-            unker.unk3 = read_uint(f)
-            unker.unk4 = read_uint(f)
-            mesh.unkers.append(unker)
-
-        mesh.part_count = read_uint(f)
+        mesh.name = f.read_string()
+        mesh.unk_count = f.read_uint()
+        mesh.unkers = [model_mesh_unk(*f.read_struct(mesh_unk_struct)) for js in range(0, mesh.unk_count)]
+
+        mesh.part_count = f.read_uint()
         mesh.parts = []
         for js in range(0, mesh.part_count):
             part = model_mesh_part()
-            part.label = read_string(f)
-            part.first_vert_index = read_uint(f)
-            part.last_vert_index = read_uint(f)
-            part.indices_offset = read_uint(f)
-            part.triangles_count = read_uint(f)
-            part.bounds = read_bounds(f)
+            part.label = f.read_string()
+            values = f.read_struct(part_struct)
+            part.first_vert_index, part.last_vert_index, part.indices_offset, part.triangles_count = values[:4]
+            part.bounds = object_bounds(*values[4:])
             mesh.parts.append(part)
 
-        mesh.bounds = read_bounds(f)
-        mesh.first_vert_index = read_uint(f)
-        mesh.indices_offset = read_uint(f)
-        mesh.vert_count = read_uint(f)
+        values = f.read_struct(mesh_tail_struct)
+        mesh.bounds = object_bounds(*values[:8])
+        mesh.first_vert_index, mesh.indices_offset, mesh.vert_count = values[8:]
         meshes.append(mesh)
     return meshes
 
 def read_model_coords(f):
     result = model_coord_data()
-    #result.label     = read_string(f) # theres no way for us to read this
-    result.matrix_1  = read_float(f)
-    result.matrix_2  = read_float(f)
-    result.matrix_3  = read_float(f)
-    result.matrix_4  = read_float(f)
-    result.matrix_5  = read_float(f)
-    result.matrix_6  = read_float(f)
-    result.matrix_7  = read_float(f)
-    result.matrix_8  = read_float(f)
-    result.matrix_9  = read_float(f)
-    result.matrix_10 = read_float(f)
-    result.matrix_11 = read_float(f)
-    result.matrix_12 = read_float(f)
-    result.matrix_13 = read_float(f)
-    result.matrix_14 = read_float(f)
-    result.matrix_15 = read_float(f)
-    result.matrix_16 = read_float(f)
-    result.bounds    = read_bounds(f)
-    #result.unk       = read_ubyte(f) # no point in reading this data 
-    #result.name      = read_string(f)
+    #result.label     = f.read_string() # theres no way for us to read this
+    values = f.read_struct(coords_struct)
+    result.matrix    = np.array(values[:16], dtype=np.float32).reshape(4, 4)
+    result.bounds    = object_bounds(*values[16:])
+    #result.unk       = f.read_ubyte() # no point in reading this data 
+    #result.name      = f.read_string()
     return result # theres also seemingly a single byte that goes before this data?
 
 
-# shorthand functions
-def read(f, len): 
-    result = bytearray(f.read(len))
-    result.reverse()
-    #print(result)
-    #print(f.read(len))
-    #print(type(f.read(len)))
-    return result
-
-def read_uint(f):   return struct.unpack('I', read(f, 4))[0]
-def read_int(f):    return struct.unpack('i', read(f, 4))[0]
-def read_ushort(f): return struct.unpack('H', read(f, 2))[0]
-def read_short(f):  return struct.unpack('h', read(f, 2))[0]
-def read_ubyte(f):  return struct.unpack('B', read(f, 1))[0]
-def read_byte(f):   return struct.unpack('b', read(f, 1))[0]
-
-def read_float(f): return struct.unpack('f', read(f, 4))[0]
-def read_float16(f): return struct.unpack('e', read(f, 2))[0]
-
-def read_norm(f): 
-    read_value = read_uint(f)
-
-    #thing = (read_value / 4294967295.0)  * (360)
-    thing = (((read_value / 4294967295.0) * 2.0) - 1.0) * (math.pi*2)
-    #if (thing > math.pi*1) and (thing < math.pi*3):
-    #    thing = 0.0 # (math.pi*2) - thing
-
-    return thing
-    return (((read_uint(f) / 4294967295) * 2.0) - 1.0) * (math.pi*2)
-    #return (read_int(f) / 2147483647.5) * (math.pi*2)
+# the coord data sits right before the name of its mesh, with a single unknown byte in between
+model_coords_size = 97
 
-def read_string(f): 
-    result = bytearray()
-    curr_byte = f.read(1)
-    while curr_byte != b'\x00':
-        result += curr_byte
-        curr_byte = f.read(1)
-    return result.decode('utf-8')
-
-def read_fixed_string(f, length):
-    return f.read(length).decode('utf-8')
+# finds the coord data of every mesh in one pass over the rest of the file, returns the offsets in the same order as meshes
+def index_model_coords(f, meshes, start):
+    names = {} # encoded name -> name
+    for mesh in meshes:
+        if mesh.name != "": names.setdefault(mesh.name.encode('utf-8'), mesh.name)
+    occurrences = {}
+    first = start + model_coords_size
+    if len(names) > 0 and first < len(f.map):
+        # the names end on their null terminator, so only the bytes before each null get looked up.
+        # longest names first, so a name cant match as the end of a longer one
+        lengths = sorted(set(len(name) for name in names), reverse=True)
+        tail = np.frombuffer(f.buffer, dtype=np.uint8, offset=first)
+        nulls = np.flatnonzero(tail == 0)
+        # most nulls are inside the coord data, only the ones after a byte some name ends with can be the end of a name
+        last_bytes = np.zeros(256, dtype=bool)
+        last_bytes[[name[-1] for name in names]] = True
+        nulls = nulls[(nulls > 0) & last_bytes[tail[nulls-1]]] + first
+        del tail # dont keep the map alive
+        for end in nulls.tolist():
+            for length in lengths:
+                if end - length < first: continue
+                name = names.get(f.map[end-length:end])
+                if name is not None:
+                    occurrences.setdefault(name, []).append(end - length - model_coords_size)
+                    break
+
+    # meshes that share a name take the matches in order
+    offsets = []
+    missing = []
+    used = {}
+    for mesh in meshes:
+        index = used.get(mesh.name, 0)
+        found = occurrences.get(mesh.name, [])
+        if index >= len(found):
+            missing.append(mesh.name)
+            continue
+        used[mesh.name] = index + 1
+        offsets.append(found[index])
+    if len(missing) > 0: raise Exception("failed to find position data for " + ", ".join(repr(name) for name in missing))
+
+    for name, count in used.items():
+        if len(occurrences[name]) > count:
+            print("warning: found " + str(len(occurrences[name])) + " position data blocks for " + repr(name) + ", only the first " + str(count) + " are used")
+    return offsets
+
+
+uint_struct = struct.Struct('>I')
+int_struct = struct.Struct('>i')
+ushort_struct = struct.Struct('>H')
+short_struct = struct.Struct('>h')
+ubyte_struct = struct.Struct('>B')
+byte_struct = struct.Struct('>b')
+float_struct = struct.Struct('>f')
+float16_struct = struct.Struct('>e')
+
+# cursor over a memory mapped model file, fields are unpacked straight out of the map without copying
+class model_reader:
+    def __init__(self, filepath):
+        with open(filepath, mode="rb") as file:
+            self.map = mmap.mmap(file.fileno(), 0, access=mmap.ACCESS_READ)
+        self.buffer = memoryview(self.map)
+        self.pos = 0
+
+    def __enter__(self): return self
+    def __exit__(self, *args): self.close()
+    def close(self):
+        # arrays from read_array still point into the map, in that case it gets unmapped once they're gone
+        try:
+            self.buffer.release()
+            self.map.close()
+        except BufferError: pass
+
+    def size(self): return len(self.map)
+    def tell(self): return self.pos
+    def seek(self, pos): self.pos = pos
+    def skip(self, length): self.pos += length
+    def find(self, sub, start = 0): return self.map.find(sub, start)
+
+    # all the values of a precompiled struct.Struct
+    def read_struct(self, compiled):
+        result = compiled.unpack_from(self.buffer, self.pos)
+        self.pos += compiled.size
+        return result
+    def read_uint(self):    return self.read_struct(uint_struct)[0]
+    def read_int(self):     return self.read_struct(int_struct)[0]
+    def read_ushort(self):  return self.read_struct(ushort_struct)[0]
+    def read_short(self):   return self.read_struct(short_struct)[0]
+    def read_ubyte(self):   return self.read_struct(ubyte_struct)[0]
+    def read_byte(self):    return self.read_struct(byte_struct)[0]
+    def read_float(self):   return self.read_struct(float_struct)[0]
+    def read_float16(self): return self.read_struct(float16_struct)[0]
+
+    def read_string(self):
+        end = self.map.find(b'\x00', self.pos)
+        if end < 0: raise Exception("unterminated string at " + str(self.pos))
+        result = str(self.buffer[self.pos:end], 'utf-8')
+        self.pos = end + 1
+        return result
+    def read_fixed_string(self, length):
+        result = str(self.buffer[self.pos:self.pos+length], 'utf-8')
+        self.pos += length
+        return result.split('\x00', 1)[0] # drop the null padding
+
+    # typed array view over the next count elements, no copy is made
+    def read_array(self, dtype, count):
+        result = np.frombuffer(self.buffer, dtype=dtype, count=count, offset=self.pos)
+        self.pos += result.nbytes
+        return result
+
+# vectorized version of the old per vertex normal reader, turns raw uints into angles
+def decode_norms(values):
+    #return (values / 2147483647.5) * (math.pi*2)
+    return (((values / 4294967295.0) * 2.0) - 1.0) * (math.pi*2)
+
+# unit normals from the two packed angles of each vertex, the cosine of n_x is shared by x and y
+def decode_normals(raw_x, raw_y):
+    n_x = decode_norms(raw_x)
+    n_y = decode_norms(raw_y)
+    cos_x = np.cos(n_x)
+    normals = np.empty((len(n_x), 3), dtype=np.float32)
+    normals[:, 0] = np.cos(n_y) * cos_x
+    normals[:, 1] = np.sin(n_y) * cos_x
+    normals[:, 2] = np.sin(n_x)
+    return normals
+
+# packed RGBA uints to float colors
+def decode_colors(colors):
+    return np.stack((colors&255, (colors>>8)&255, (colors>>16)&255, colors>>24), axis=1).astype(np.float32) * np.float32(1.0/255.0)
 
 
 def read_model_header(f):
     header = model_header()
-    header.sig_count = read_int(f)
+    header.sig_count = f.read_int()
     header.signatures = []
     for i in range(0, header.sig_count):
         sig = model_header_signature()
-        sig.signature = read_string(f)
-        sig.unk = read_uint(f)
+        sig.signature = f.read_string()
+        sig.unk = f.read_uint()
         header.signatures.append(sig)
     return header
 
 
+# puts decoded rows back at their vertex indices, rows that werent decoded stay zero
+def scatter_rows(values, rows, count):
+    if rows is None: return values
+    result = np.zeros((count,) + values.shape[1:], dtype=values.dtype)
+    result[rows] = values
+    return result
+
+# vertex_ranges is an optional list of (first, last+1), only those vertices get decoded
+def read_vertex_buffer(f, layout, vert_count, vertex_ranges = None):
+    # read the whole block in one go and let numpy split it into fields
+    raw = f.read_array(layout.dtype, vert_count)
+    rows = None
+    if vertex_ranges is not None:
+        needed = np.zeros(vert_count, dtype=bool)
+        for first, last in vertex_ranges: needed[first:last] = True
+        rows = np.flatnonzero(needed)
+        raw = raw[rows]
+
+    result = vertex_buffer()
+    result.count = vert_count
+    result.positions = scatter_rows(np.stack((raw['x'], raw['y'], raw['z']), axis=1).astype(np.float32), rows, vert_count)
+    result.normals = scatter_rows(decode_normals(raw['n_x'], raw['n_y']), rows, vert_count)
+    result.uvs = scatter_rows(np.stack((raw['uv_x'], raw['uv_y']), axis=1).astype(np.float32), rows, vert_count)
+    if layout.has('color'):
+        result.colors = scatter_rows(decode_colors(raw['color'].astype(np.uint32)), rows, vert_count)
+    if layout.has('bone_weights'):
+        result.bone_weights = scatter_rows(raw['bone_weights'].astype(np.uint32), rows, vert_count)
+        result.bone_indices = scatter_rows(raw['bone_indices'].astype(np.uint32), rows, vert_count)
+    return result
+
+
+index_dtypes = {
+    3: np.dtype('>u4'), # 4 byte width indices
+    2: np.dtype('>u2'), # 2 byte wide indices
+    1: np.dtype('u1'),  # 1 byte wide indices # UNCONFIRMED!!!!
+}
 def read_model_indices(f):
     # read indices
-    indicies_byte_length = read_uint(f)
-    indicies_width = read_uint(f)
-    indices = []
-    if indicies_width == 3: # 4 byte width indices
-        indicies_byte_length //= 4
-        for i in range(0, indicies_byte_length):
-            indices.append(read_uint(f))
-    elif indicies_width == 2: # 2 byte wide indices
-        indicies_byte_length //= 2
-        for i in range(0, indicies_byte_length):
-            indices.append(read_ushort(f))
-    elif indicies_width == 1: # 1 byte wide indices # UNCONFIRMED!!!!
-        indicies_byte_length //= 1
-        for i in range(0, indicies_byte_length):
-            indices.append(read_ubyte(f))
-    else: raise Exception("bad vert indices byte width")
-    return indices
+    indicies_byte_length = f.read_uint()
+    indicies_width = f.read_uint()
+    index_dtype = index_dtypes.get(indicies_width)
+    if index_dtype is None: raise Exception("bad vert indices byte width")
+    indices_count = indicies_byte_length // index_dtype.itemsize
+    # big endian array straight over the file bytes, no per index copying
+    return f.read_array(index_dtype, indices_count)
+
+# (N,3) view of the index buffer, one row per triangle
+def triangle_view(indices, offset = 0, count = -1):
+    if count < 0: count = (len(indices) - offset) // 3
+    return indices[offset:offset+(count*3)].reshape(count, 3)
 
 
 ########## DEBUG ###########
@@ -243,207 +466,354 @@ def set_origin(obj, global_coord):
     # Move the object by the difference of the global point and the object's location
     obj.matrix_world.translation += (global_coord - obj.matrix_world.translation)
 
-def add_object(name,x,y,z):
-    bpy_mesh = bpy.data.meshes.new("myMesh")
+# corner order is x/y/z bits, so these are the 12 box edges
+bounds_box_edges = np.array(((0,1), (2,3), (4,5), (6,7), (0,2), (1,3), (4,6), (5,7), (0,4), (1,5), (2,6), (3,7)), dtype=np.int32)
+
+# draws all the bounds as wireframe boxes in a single mesh object, in file coordinates (no transforms applied)
+def add_bounds_object(name, bounds_list):
+    mins = np.array([(bounds.min_x, bounds.min_y, bounds.min_z) for bounds in bounds_list], dtype=np.float32).reshape(-1, 1, 3)
+    maxs = np.array([(bounds.max_x, bounds.max_y, bounds.max_z) for bounds in bounds_list], dtype=np.float32).reshape(-1, 1, 3)
+    corner_bits = ((np.arange(8).reshape(1, 8, 1) >> np.arange(3)) & 1).astype(bool)
+    corners = np.where(corner_bits, maxs, mins).reshape(-1, 3)
+    edges = (bounds_box_edges.reshape(1, 12, 2) + (np.arange(len(bounds_list)) * 8).reshape(-1, 1, 1)).astype(np.int32)
+
+    bpy_mesh = bpy.data.meshes.new(name)
+    bpy_mesh.vertices.add(len(corners))
+    bpy_mesh.vertices.foreach_set("co", corners.ravel())
+    bpy_mesh.edges.add(len(bounds_list) * 12)
+    bpy_mesh.edges.foreach_set("vertices", edges.ravel())
+    bpy_mesh.update()
     obj = bpy.data.objects.new(name, bpy_mesh)
+    obj.display_type = 'WIRE'
     bpy.context.collection.objects.link(obj)
-    obj.location = obj.location + mathutils.Vector((x,y,z))
-
-    bpy.context.view_layer.objects.active = obj
-    obj.select_set(True)
-
-    bm = bmesh.new()
-    bmesh.ops.create_uvsphere(bm, u_segments=32, v_segments=16, radius=1)
-    bm.to_mesh(bpy_mesh)
-    bm.free()
-
-    obj.select_set(False)
-
-
-
-def construct_meshes(meshes, verts, indices, f, bone_count = -1, bone_names = [], bone_orientations = [], bone_parents = []):
-    has_vert_color = verts[0].color != None
-    bytes_offset = f.tell()
-    excess_bytes = f.read() 
+    return obj
+
+
+
+def mesh_origin(mesh):
+    #return np.array(((mesh.bounds.min_x+mesh.bounds.max_x)/2, (mesh.bounds.min_y+mesh.bounds.max_y)/2, (mesh.bounds.min_z+mesh.bounds.max_z)/2), dtype=np.float32)
+    return np.array((mesh.bounds.min_x, mesh.bounds.min_y, mesh.bounds.min_z), dtype=np.float32)
+    #return np.array((mesh.bounds.max_x, mesh.bounds.max_y, mesh.bounds.max_z), dtype=np.float32)
+
+# the positions of every part of a mesh relative to the mesh origin, subtracted once for the whole range the parts cover.
+# returns the index of the first vertex in the range with the float32 positions
+def mesh_local_positions(model, mesh):
+    if len(mesh.parts) == 0: return 0, model.verts.positions[0:0]
+    first = min(part.first_vert_index for part in mesh.parts)
+    last = max(part.last_vert_index for part in mesh.parts)+1
+    return first, model.verts.positions[first:last] - mesh_origin(mesh)
+
+# the vertex data of a part, relative to the mesh origin, with triangles indexing into it.
+# everything but the triangles is a view into the per file buffers (or into local_positions, from mesh_local_positions), so dont write to them.
+# colors are None when the file has none
+def gather_part(model, mesh, part, local_positions = None):
+    verts = model.verts
+    first = part.first_vert_index
+    last = part.last_vert_index+1
+    with profile_stage("gather"):
+        if local_positions is None: positions = verts.positions[first:last] - mesh_origin(mesh)
+        else: positions = local_positions[1][first-local_positions[0]:last-local_positions[0]]
+        uvs = verts.uvs[first:last]
+        normals = verts.normals[first:last]
+        colors = None if verts.colors is None else verts.colors[first:last]
+        triangles = triangle_view(model.indices, part.indices_offset, part.triangles_count).astype(np.int64) - first
+    return positions, triangles, uvs, normals, colors
+
+# 4x4 transform from the coord data, the same one construct_meshes gives each object (matrix plus the bounds offset)
+def mesh_transform(coord_data):
+    transform = coord_data.matrix.astype(np.float64)
+    transform[:3, 3] += (coord_data.bounds.min_x, coord_data.bounds.min_y, coord_data.bounds.min_z)
+    return transform
+
+def transform_points(transform, points):
+    return points @ transform[:3, :3].T + transform[:3, 3]
+
+def transform_normals(transform, normals):
+    result = normals @ np.linalg.inv(transform[:3, :3])
+    lengths = np.linalg.norm(result, axis=1, keepdims=True)
+    return result / np.where(lengths == 0.0, 1.0, lengths)
+
+# builds a triangle mesh straight from flat arrays through foreach_set, per vertex normals/uvs/colors are expanded to the loops.
+# material_indices is an optional material slot per triangle
+def fill_mesh(bpy_mesh, positions, triangles, uvs = None, normals = None, colors = None, material_indices = None):
+    triangle_count = len(triangles)
+    loop_count = triangle_count*3
+    loop_verts = np.ascontiguousarray(triangles, dtype=np.int32).ravel()
+
+    with profile_stage("mesh"):
+        bpy_mesh.vertices.add(len(positions))
+        bpy_mesh.vertices.foreach_set("co", np.ascontiguousarray(positions, dtype=np.float32).ravel())
+        bpy_mesh.loops.add(loop_count)
+        bpy_mesh.loops.foreach_set("vertex_index", loop_verts)
+        bpy_mesh.polygons.add(triangle_count)
+        bpy_mesh.polygons.foreach_set("loop_start", np.arange(0, loop_count, 3, dtype=np.int32))
+        bpy_mesh.polygons.foreach_set("loop_total", np.full(triangle_count, 3, dtype=np.int32))
+        if material_indices is not None: bpy_mesh.polygons.foreach_set("material_index", np.ascontiguousarray(material_indices, dtype=np.int32))
+        bpy_mesh.update(calc_edges=True)
+
+    if uvs is not None:
+        with profile_stage("uvs"):
+            uv_layer = bpy_mesh.uv_layers.new()
+            bpy_mesh.uv_layers.active = uv_layer
+            uv_layer.data.foreach_set("uv", np.ascontiguousarray(uvs[loop_verts], dtype=np.float32).ravel())
+    if normals is not None:
+        with profile_stage("normals"):
+            bpy_mesh.normals_split_custom_set_from_vertices(np.ascontiguousarray(normals, dtype=np.float32))
+            bpy_mesh.use_auto_smooth = True
+    if colors is not None:
+        with profile_stage("colors"):
+            color_layer = bpy_mesh.vertex_colors.new(name="vert_colors")
+            color_layer.data.foreach_set("color", np.ascontiguousarray(colors[loop_verts], dtype=np.float32).ravel())
+
+
+# one armature per file, every part binds to it
+def build_armature(bone_names, bone_orientations, bone_parents):
+    arm = bpy.data.armatures.new('MyArmature')
+    arm_obj = bpy.data.objects.new('MyArmature', arm)
+    bpy.context.collection.objects.link(arm_obj)
+
+    bpy.ops.object.select_all(action='DESELECT')
+    bpy.context.view_layer.objects.active = arm_obj
+    bpy.ops.object.mode_set(mode='EDIT', toggle=False)
+    ebs = arm.edit_bones
+
+    # Create the bones
+    bones = []
+    for i in range(0, len(bone_names)):
+        pos_x, pos_y, pos_z = bone_orientations.positions[i].tolist()
+        bone = ebs.new(bone_names[i])
+        bone.head = (pos_x, pos_y, pos_z)
+        bone.tail = (pos_x, pos_y, pos_z+1.0)
+        bones.append(bone)
+    # setup parenting, unconnected so the bones keep their offset
+    for i in range(0, len(bone_names)):
+        parent = int(bone_parents[i])
+        if parent == -1: continue
+        bones[i].use_connect = False
+        bones[i].parent = bones[parent]
+
+    bpy.ops.object.mode_set(mode='OBJECT')
+    return arm_obj
+
+# (shift, mask, max) of the 4 weights packed into bone_weights, the first two are 10 bits and the last two are 5
+bone_weight_fields = ((0, 0x3ff, 1023.0), (10, 0x3ff, 1023.0), (20, 0x1F, 31.0), (26, 0x1F, 31.0))
+
+# assigns all the weights of a part at once, with one add call per bone and weight value
+def apply_bone_weights(groups_array, bone_indices, bone_weights):
+    local_verts = np.arange(len(bone_indices))
+    all_bones = []
+    all_weights = []
+    all_verts = []
+    prev_bones = None
+    for slot, (shift, mask, max_value) in enumerate(bone_weight_fields):
+        bones = (bone_indices >> (slot*8)) & 0xff
+        weights = ((bone_weights >> shift) & mask) / max_value
+        # a slot repeating the bone before it is unused
+        used = slice(None) if prev_bones is None else bones != prev_bones
+        all_bones.append(bones[used])
+        all_weights.append(weights[used])
+        all_verts.append(local_verts[used])
+        prev_bones = bones
+    bones = np.concatenate(all_bones)
+    weights = np.concatenate(all_weights)
+    verts = np.concatenate(all_verts)
+    if len(bones) == 0: return
+
+    # sort by bone then weight, each run is one add call
+    order = np.lexsort((weights, bones))
+    bones = bones[order]
+    weights = weights[order]
+    verts = verts[order]
+    splits = np.flatnonzero((bones[1:] != bones[:-1]) | (weights[1:] != weights[:-1])) + 1
+    for start, end in zip(np.concatenate(([0], splits)), np.concatenate((splits, [len(bones)]))):
+        groups_array[bones[start]].add(verts[start:end].tolist(), float(weights[start]), 'ADD')
+
+
+# hash of everything that ends up in a part mesh, parts with the same key can share their mesh datablock
+def part_geometry_key(label, *arrays):
+    digest = hashlib.blake2b(label.encode('utf-8'), digest_size=20)
+    for array in arrays:
+        if array is None:
+            digest.update(b'none')
+            continue
+        array = np.ascontiguousarray(array)
+        digest.update(str(array.shape).encode('utf-8') + array.dtype.str.encode('utf-8'))
+        digest.update(array.data)
+    return digest.digest()
+
+# running totals of optimize_part over the parts of a file
+class optimize_stats:
+    __slots__ = ('parts', 'vertices_before', 'unreferenced', 'welded', 'triangles_before', 'degenerate')
+    def __init__(self):
+        self.parts = 0
+        self.vertices_before = 0
+        self.unreferenced = 0
+        self.welded = 0
+        self.triangles_before = 0
+        self.degenerate = 0
+
+    def summary(self):
+        vertices_after = self.vertices_before - self.unreferenced - self.welded
+        return (str(self.parts) + " parts, " + str(self.vertices_before) + " -> " + str(vertices_after) + " vertices (" + str(self.unreferenced) + " unreferenced, "
+                + str(self.welded) + " welded), " + str(self.triangles_before) + " -> " + str(self.triangles_before - self.degenerate) + " triangles")
+
+# compacts the arrays of a part before it becomes a mesh: vertices no triangle uses are dropped, vertices that are identical in every attribute
+# get welded into one (and triangles that collapse because of it are dropped), and the rest are renumbered in the order the triangles first use them.
+# the triangle order itself is kept, the files already come ordered for the consoles vertex cache.
+# attributes is a list of per vertex arrays (None is passed through). returns the new triangles, the new attributes and the old index of every new vertex
+def optimize_part(triangles, attributes, stats = None):
+    vertex_count = len(attributes[0])
+    if len(triangles) == 0:
+        # nothing uses any of the vertices
+        if stats is not None:
+            stats.parts += 1
+            stats.vertices_before += vertex_count
+            stats.unreferenced += vertex_count
+        return np.zeros((0, 3), dtype=np.int64), [None if array is None else array[:0] for array in attributes], np.zeros(0, dtype=np.int64)
+    used = np.unique(triangles)
+    # one row of raw bytes per vertex, so vertices with exactly the same attributes compare equal
+    rows = np.hstack([np.ascontiguousarray(array[used]).reshape(len(used), -1).view(np.uint8) for array in attributes if array is not None])
+    rows = np.ascontiguousarray(rows).view(np.dtype((np.void, rows.shape[1]))).ravel()
+    unique_rows, first_row, welded_ids = np.unique(rows, return_index=True, return_inverse=True)
+    lookup = np.zeros(vertex_count, dtype=np.int64)
+    lookup[used] = welded_ids.ravel()
+    new_triangles = lookup[triangles]
+    degenerate = (new_triangles[:, 0] == new_triangles[:, 1]) | (new_triangles[:, 1] == new_triangles[:, 2]) | (new_triangles[:, 0] == new_triangles[:, 2])
+    new_triangles = new_triangles[~degenerate]
+
+    # renumber by first use, vertices only used by dropped triangles go too
+    still_used, first_use = np.unique(new_triangles.ravel(), return_index=True)
+    order = still_used[np.argsort(first_use)]
+    renumber = np.zeros(len(unique_rows), dtype=np.int64)
+    renumber[order] = np.arange(len(order))
+    vertex_map = used[first_row[order]]
+
+    if stats is not None:
+        stats.parts += 1
+        stats.vertices_before += vertex_count
+        stats.unreferenced += vertex_count - len(used) + len(unique_rows) - len(order)
+        stats.welded += len(used) - len(unique_rows)
+        stats.triangles_before += len(triangles)
+        stats.degenerate += int(np.count_nonzero(degenerate))
+    return renumber[new_triangles], [None if array is None else array[vertex_map] for array in attributes], vertex_map
+
+# shared_meshes maps part_geometry_key -> mesh datablock, pass the same dict to several calls to share meshes between files too
+# show_bounds adds one wireframe object with the mesh, coord data and part bounds of the file.
+# optimize runs optimize_part on every new mesh and prints how much it saved.
+# this is a generator that stops before every part with (parts done, part count), so the import can be spread out and cancelled
+def construct_meshes_steps(model, armature = None, shared_meshes = None, show_bounds = False, optimize = False):
+    verts = model.verts
+    bone_names = model.bone_names
+    debug_bounds = []
+    stats = optimize_stats()
+    parts_total = sum(len(mesh.parts) for mesh in model.meshes)
+    parts_done = 0
     
     mesh_index = 0
-    for mesh in meshes:
+    for mesh in model.meshes:
         mesh_index += 1
-        # get alternate component mesh component (cant just read there because theres too much junk in the way)
-        offset = excess_bytes.find(mesh.name.encode('utf-8'))
-        if offset < 0: raise Exception("failed to find position data for " + mesh.name)
-
-        f.seek(bytes_offset + offset - 97)
-        # then read that junk
-        coord_data = read_model_coords(f)
-        object_pos_matrix = Matrix((
-            (coord_data.matrix_1,  coord_data.matrix_2,  coord_data.matrix_3,  coord_data.matrix_4 ),
-            (coord_data.matrix_5,  coord_data.matrix_6,  coord_data.matrix_7,  coord_data.matrix_8 ),
-            (coord_data.matrix_9,  coord_data.matrix_10, coord_data.matrix_11, coord_data.matrix_12),
-            (coord_data.matrix_13, coord_data.matrix_14, coord_data.matrix_15, coord_data.matrix_16)))
+        coord_data = model.coords[mesh_index-1]
+        object_pos_matrix = Matrix(coord_data.matrix.tolist())
         #coord_data_origin = ((coord_data.bounds.min_x+coord_data.bounds.max_x)/2, (coord_data.bounds.min_y+coord_data.bounds.max_y)/2, (coord_data.bounds.min_z+coord_data.bounds.max_z)/2)
         coord_data_origin = (coord_data.bounds.min_x, coord_data.bounds.min_y, coord_data.bounds.min_z)
         #coord_data_origin = (coord_data.bounds.max_x, coord_data.bounds.max_y, coord_data.bounds.max_z)
 
-
-        add_object(str(mesh_index) +"_b_min", mesh.bounds.min_x, mesh.bounds.min_y, mesh.bounds.min_z )
-        add_object(str(mesh_index) +"_b_max", mesh.bounds.max_x, mesh.bounds.max_y, mesh.bounds.max_z )
-        add_object(str(mesh_index) +"_m_min", coord_data.bounds.min_x, coord_data.bounds.min_y, coord_data.bounds.min_z )
-        add_object(str(mesh_index) +"_m_max", coord_data.bounds.max_x, coord_data.bounds.max_y, coord_data.bounds.max_z )
+        if show_bounds:
+            debug_bounds.append(mesh.bounds)
+            debug_bounds.append(coord_data.bounds)
+        with profile_stage("gather"): local_positions = mesh_local_positions(model, mesh)
 
         part_index = 0
         for part in mesh.parts:
+            yield parts_done, parts_total
+            parts_done += 1
             part_index += 1
-            add_object(str(mesh_index) +"_"+str(part_index)+"_min", part.bounds.min_x, part.bounds.min_y, part.bounds.min_z )
-            add_object(str(mesh_index) +"_"+str(part_index)+"_max", part.bounds.max_x, part.bounds.max_y, part.bounds.max_z )
-
-            #part_mat = bpy.data.materials.new(name=part.label)
-            #obj.data.materials.append(part_mat)
-            bpy_mesh = bpy.data.meshes.new("myMesh")
-            obj = bpy.data.objects.new(str(mesh_index) +"_"+ str(part_index) +"_"+ mesh.name +"_"+ part.label, bpy_mesh)
-            #print(mesh.name + "_" + part.label)
-            bpy.context.collection.objects.link(obj)
-            # set orientation (we need to set the origin point first !!!!)
-            #origin = ((mesh.bounds.min_x+mesh.bounds.max_x)/2, (mesh.bounds.min_y+mesh.bounds.max_y)/2, (mesh.bounds.min_z+mesh.bounds.max_z)/2)
-            origin = (mesh.bounds.min_x, mesh.bounds.min_y, mesh.bounds.min_z)
-            #origin = (mesh.bounds.max_x, mesh.bounds.max_y, mesh.bounds.max_z)
-            obj.matrix_world = object_pos_matrix # set world pos first, as cursor overrides this??
-            #print(object_pos_matrix.to_translation())
-            #print(coord_data_origin)
-            #obj.location = obj.location + mathutils.Vector(origin)
-            obj.location = obj.location + mathutils.Vector(coord_data_origin)
-            # bpy.ops.object.mode_set(mode='OBJECT')
-            # obj.select_set(True)
-            # bpy.context.scene.cursor.location = mathutils.Vector(origin)
-            # bpy.ops.object.origin_set(type='ORIGIN_CURSOR')
-            # obj.select_set(False)
-            #print(obj.location)
-            #obj.matrix_world = object_pos_matrix
-            #print(obj.location)
-            #set_origin(obj, mathutils.Vector(((part.bounds.min_x+part.bounds.max_x)/2, (part.bounds.min_y+part.bounds.max_y)/2, (part.bounds.min_z+part.bounds.max_z)/2)))
-            #bpy.context.scene.cursor.location = mathutils.Vector((part.bounds.min_x, part.bounds.min_y, part.bounds.min_z))
-            #bpy.ops.object.origin_set({"object": obj}, type="ORIGIN_CURSOR")
-            #obj.location = (part.bounds.min_x-part.bounds.max_x, part.bounds.min_y-part.bounds.max_y, part.bounds.min_z-part.bounds.max_z)
-            #aobj.location = ((part.bounds.min_x+part.bounds.max_x)/2, (part.bounds.min_y+part.bounds.max_y)/2, (part.bounds.min_z+part.bounds.max_z)/2)
-            #obj.location = (part.bounds.min_x, part.bounds.min_y, part.bounds.min_z)
-            #obj.rotation_euler = (math.radians(part.bounds.pitch), math.radians(part.bounds.yaw), 0)
+            if show_bounds: debug_bounds.append(part.bounds)
+
+            # gather local verts
+            first = part.first_vert_index
+            last = part.last_vert_index+1
+            blender_verts, blender_indices, blender_UVs, blender_normals, blender_vert_colors = gather_part(model, mesh, part, local_positions)
+
+            # identical parts share one mesh datablock. skinned parts dont, the vertex weights live on the mesh
+            geometry_key = None
+            bpy_mesh = None
+            if shared_meshes is not None and armature is None:
+                with profile_stage("sharing"):
+                    geometry_key = part_geometry_key(part.label, blender_verts, blender_indices, blender_UVs, blender_normals, blender_vert_colors)
+                    bpy_mesh = shared_meshes.get(geometry_key)
+            is_new_mesh = bpy_mesh is None
+
+            with profile_stage("objects"):
+                #part_mat = bpy.data.materials.new(name=part.label)
+                #obj.data.materials.append(part_mat)
+                if is_new_mesh: bpy_mesh = bpy.data.meshes.new("myMesh")
+                obj = bpy.data.objects.new(str(mesh_index) +"_"+ str(part_index) +"_"+ mesh.name +"_"+ part.label, bpy_mesh)
+                #print(mesh.name + "_" + part.label)
+                bpy.context.collection.objects.link(obj)
+                # set orientation (we need to set the origin point first !!!!)
+                obj.matrix_world = object_pos_matrix # set world pos first, as cursor overrides this??
+                #print(object_pos_matrix.to_translation())
+                #print(coord_data_origin)
+                #obj.location = obj.location + mathutils.Vector(origin)
+                obj.location = obj.location + mathutils.Vector(coord_data_origin)
+                # bpy.ops.object.mode_set(mode='OBJECT')
+                # obj.select_set(True)
+                # bpy.context.scene.cursor.location = mathutils.Vector(origin)
+                # bpy.ops.object.origin_set(type='ORIGIN_CURSOR')
+                # obj.select_set(False)
+                #print(obj.location)
+                #obj.matrix_world = object_pos_matrix
+                #print(obj.location)
+                #set_origin(obj, mathutils.Vector(((part.bounds.min_x+part.bounds.max_x)/2, (part.bounds.min_y+part.bounds.max_y)/2, (part.bounds.min_z+part.bounds.max_z)/2)))
+                #bpy.context.scene.cursor.location = mathutils.Vector((part.bounds.min_x, part.bounds.min_y, part.bounds.min_z))
+                #bpy.ops.object.origin_set({"object": obj}, type="ORIGIN_CURSOR")
+                #obj.location = (part.bounds.min_x-part.bounds.max_x, part.bounds.min_y-part.bounds.max_y, part.bounds.min_z-part.bounds.max_z)
+                #aobj.location = ((part.bounds.min_x+part.bounds.max_x)/2, (part.bounds.min_y+part.bounds.max_y)/2, (part.bounds.min_z+part.bounds.max_z)/2)
+                #obj.location = (part.bounds.min_x, part.bounds.min_y, part.bounds.min_z)
+                #obj.rotation_euler = (math.radians(part.bounds.pitch), math.radians(part.bounds.yaw), 0)
+
+            if not is_new_mesh: continue # linked duplicate, the mesh is already built
+
+            part_bone_indices = None
+            part_bone_weights = None
+            if armature is not None:
+                part_bone_indices = verts.bone_indices[first:last]
+                part_bone_weights = verts.bone_weights[first:last]
+            if optimize:
+                with profile_stage("optimize"):
+                    attributes = [blender_verts, blender_UVs, blender_normals, blender_vert_colors, part_bone_indices, part_bone_weights]
+                    blender_indices, attributes, vertex_map = optimize_part(blender_indices, attributes, stats)
+                    blender_verts, blender_UVs, blender_normals, blender_vert_colors, part_bone_indices, part_bone_weights = attributes
 
             # create and assign material
-            mat = bpy.data.materials.get(part.label)
-            if mat is None: mat = bpy.data.materials.new(part.label)
-            obj.data.materials.append(mat)
+            with profile_stage("objects"):
+                mat = bpy.data.materials.get(part.label)
+                if mat is None: mat = bpy.data.materials.new(part.label)
+                obj.data.materials.append(mat)
 
-            # gather local verts
-            blender_verts = []
-            blender_UVs = []
-            blender_normals = []
-            blender_vert_colors = []
-            for i in range(part.first_vert_index, part.last_vert_index+1):
-                vert = verts[i]
-                blender_verts.append((vert.x-origin[0], vert.y-origin[1], vert.z-origin[2]))
-                #blender_verts.append((vert.x-coord_data_origin[0], vert.y-coord_data_origin[1], vert.z-coord_data_origin[2]))
-                #blender_verts.append((vert.x, vert.y, vert.z))
-                blender_UVs.append((vert.uv_x, vert.uv_y))
-                blender_normals.append((math.cos(vert.n_y)*math.cos(vert.n_x), math.sin(vert.n_y)*math.cos(vert.n_x), math.sin(vert.n_x))) 
-                if has_vert_color == True: blender_vert_colors.append( ((vert.color&255)/255, ((vert.color>>8)&255)/255.0, ((vert.color>>16)&255)/255.0, (vert.color>>24)/255.0 ) )
-
-
-            # gather all the indices together
-            blender_indices = []
-            for i in range(0, part.triangles_count):
-                index = (i*3)+part.indices_offset
-                blender_indices.append((indices[index]-part.first_vert_index, indices[index+1]-part.first_vert_index, indices[index+2]-part.first_vert_index))
-
-            bpy_mesh.from_pydata(blender_verts, [], blender_indices)
-            
-            #########  EXTRA JUNK ########
-            # no idea what this does, bing gave me this
-            uv_layer = bpy_mesh.uv_layers.new()
-            bpy_mesh.uv_layers.active = uv_layer
-            for face in bpy_mesh.polygons:
-                for vert_idx, loop_idx in zip(face.vertices, face.loop_indices):
-                    uv_layer.data[loop_idx].uv = blender_UVs[vert_idx]
-            # no idea if this actually works, bing also gave me this
-            normals2 = []
-            for l in bpy_mesh.loops:
-                normals2.append(blender_normals[l.vertex_index])
-            # Set the custom split normals for the mesh
-            bpy_mesh.normals_split_custom_set(normals2)
-            bpy_mesh.use_auto_smooth = True
-            
-            ####### VERT COLOR JUNK ####
-            if has_vert_color == True:
-                # Get the vertex color layer
-                color_layer = bpy_mesh.vertex_colors.new(name="vert_colors")
-                # Set the color of each vertex
-                for face in bpy_mesh.polygons:
-                    for vert_idx, loop_idx in zip(face.vertices, face.loop_indices):
-                        color_layer.data[loop_idx].color = blender_vert_colors[vert_idx]
-                        #print(idx)
+            fill_mesh(bpy_mesh, blender_verts, blender_indices, blender_UVs, blender_normals, blender_vert_colors)
+            if geometry_key is not None: shared_meshes[geometry_key] = bpy_mesh
 
             ####### BONE JUNK #########
-            if bone_count != -1:
-                # setup bones
-                arm = bpy.data.armatures.new('MyArmature')
-                arm_obj = bpy.data.objects.new('MyArmature', arm)
-                bpy.context.collection.objects.link(arm_obj)
-                mod = obj.modifiers.new('Armature', type='ARMATURE')
-                mod.object = arm_obj
-                
-                bpy.ops.object.select_all(action='DESELECT')
-                bpy.context.view_layer.objects.active = arm_obj
-                bpy.ops.object.mode_set(mode='EDIT', toggle=False)
-                ebs = arm.edit_bones
-
-                # Create the bones
-                bones = []
-                for i in range(0, bone_count):
-                    name = bone_names[i]
-                    pos_data = bone_orientations[i]
-                    bone = ebs.new(name)
-                    bone.head = (pos_data.pos_x, pos_data.pos_y, pos_data.pos_z)
-                    bone.tail = (pos_data.pos_x, pos_data.pos_y, pos_data.pos_z+1.0)
-                    bones.append(bone)
-                # setup parenting
-                for i in range(0, bone_count):
-                    parent = bone_parents[i]
-                    if parent == -1: continue
-                    ebs.active = bones[parent]
-                    bones[i].select = True
-                    bpy.ops.armature.parent_set (type='OFFSET')
-                    bones[i].select = False
-
-
-                # apply vertex weights
-                bpy.ops.object.mode_set (mode='OBJECT')
-                groups = obj.vertex_groups
-                
-                groups_array = []
-                for i in range(0, bone_count):
-                    group = groups.new(name=bone_names[i])
-                    groups_array.append(group)
-
-                for i in range(part.first_vert_index, part.last_vert_index+1):
-                    vert = verts[i]
-                    # bone1
-                    bone1 = vert.bone_indices & 0xff
-                    weight1 = (vert.bone_weights & 0x3ff) / 1023.0
-                    groups_array[bone1].add([i], weight1, 'ADD')
-                    # bone2
-                    bone2 = (vert.bone_indices >> 8) & 0xff
-                    if bone2 != bone1:
-                        weight2 = ((vert.bone_weights >> 10) & 0x3ff) / 1023.0
-                        groups_array[bone2].add([i], weight2, 'ADD')
-                    # bone3
-                    bone3 = (vert.bone_indices >> 16) & 0xff
-                    if bone3 != bone2:
-                        weight3 = (vert.bone_weights >> 20 & 0x1F) / 31.0
-                        groups_array[bone3].add([i], weight3, 'ADD')
-                    # bone4
-                    bone4 = (vert.bone_indices >> 24) & 0xff
-                    if bone4 != bone3:
-                        weight4 = (vert.bone_weights >> 26 & 0x1F) / 31.0
-                        groups_array[bone4].add([i], weight4, 'ADD')
+            if armature is not None:
+                with profile_stage("skinning"):
+                    mod = obj.modifiers.new('Armature', type='ARMATURE')
+                    mod.object = armature
+
+                    # apply vertex weights
+                    groups = obj.vertex_groups
+                    
+                    groups_array = []
+                    for i in range(0, len(bone_names)):
+                        group = groups.new(name=bone_names[i])
+                        groups_array.append(group)
+
+                    apply_bone_weights(groups_array, part_bone_indices, part_bone_weights)
+
+    if optimize: print(os.path.basename(model.filepath) + ": optimized " + stats.summary())
+    if len(debug_bounds) > 0:
+        with profile_stage("bounds"): add_bounds_object(os.path.basename(model.filepath) + "_bounds", debug_bounds)
 
     # output debug information
     # mesh_index = 0
@@ -458,225 +828,1022 @@ def construct_meshes(meshes, verts, indices, f, bone_count = -1, bone_names = []
 
 
 
-def read_static_model(context, filepath, import_as_single = False):
-    print("running read_some_data...")
-    f = open(filepath, mode="rb")
-    header = read_model_header(f)
-
-    vert_stride = read_int(f)
-    vert_byte_length = read_int(f)
-    # error checking
-    has_vert_color = False
-    vert_padding = vert_stride - model_vertex_size
-    if vert_padding < 0: raise Exception("vertex stride is smaller than regular size (we'll lose vertex data)")
-    if vert_stride >= model_vertex_size+4:
-        has_vert_color = True
-        vert_padding -= 4
-        print("vertex colors!!!!")
-    # read verts
-    vert_count = vert_byte_length // vert_stride
-    verts = []
-    for i in range(0, vert_count):
-        vert = model_vertex()
-        vert.x = read_float(f)
-        vert.y = read_float(f)
-        vert.z = read_float(f)
-
-        vert.n_x = read_norm(f)
-        vert.n_y = read_norm(f)
-
-        vert.uv_x = read_float16(f)
-        vert.uv_y = read_float16(f)
-        # if possible, do vertex colors
-        if has_vert_color == True:
-            vert.color = read_uint(f)
-
-        verts.append(vert)
-        # skip padding
-        if vert_padding != 0: f.read(vert_padding)
-    
+# everything read out of a model file. no blender types in here, so it can be sent back from a worker process
+class parsed_model:
+    __slots__ = ('filepath', 'skinned', 'header', 'vert_stride', 'vert_count', 'index_count', 'verts', 'indices', 'meshes', 'coords',
+                 'bone_names', 'bone_parents', 'bone_orientations', 'profile', 'broken_parts')
+    def __init__(self):
+        self.filepath = ""
+        self.skinned = False
+        self.header = None
+        self.vert_stride = 0
+        self.vert_count = 0
+        self.index_count = 0
+        self.verts = None    # vertex_buffer, None for scans
+        self.indices = None  # flat index array, None for scans
+        self.meshes = []
+        self.coords = []     # model_coord_data for each mesh
+        self.bone_names = []
+        self.bone_parents = np.zeros(0, dtype=np.int32) # -1 for the root bone
+        self.bone_orientations = bone_buffer()
+        self.profile = None  # import_profile of the parse when it was profiled
+        self.broken_parts = set() # (mesh index, part index) of the parts that failed validation and were left out
+
+# reads the mesh table, then the coord data of each mesh out of the rest of the file
+def read_model_objects(f, model):
+    with profile_stage("mesh table"):
+        model.meshes = read_model_mesh(f)
+    # get alternate component mesh component (cant just read there because theres too much junk in the way)
+    with profile_stage("coords"):
+        model.coords = []
+        for offset in index_model_coords(f, model.meshes, f.tell()):
+            f.seek(offset)
+            # then read that junk
+            model.coords.append(read_model_coords(f))
+
+# drops the parts listed in excluded_parts, a set of (mesh index, part index). meshes left without parts are dropped too
+def filter_model_parts(model, excluded_parts):
+    meshes = []
+    coords = []
+    for mesh_index, mesh in enumerate(model.meshes):
+        mesh.parts = [part for part_index, part in enumerate(mesh.parts) if (mesh_index, part_index) not in excluded_parts]
+        mesh.part_count = len(mesh.parts)
+        if mesh.part_count == 0: continue
+        meshes.append(mesh)
+        if len(model.coords) > 0: coords.append(model.coords[mesh_index])
+    model.meshes = meshes
+    model.coords = coords
+
+# what's wrong with one part, see validate_model_parts
+class part_report:
+    __slots__ = ('mesh_index', 'part_index', 'errors', 'degenerate_triangles')
+    def __init__(self, mesh_index, part_index):
+        self.mesh_index = mesh_index
+        self.part_index = part_index
+        self.errors = []               # anything in here means the part cant be built
+        self.degenerate_triangles = 0  # triangles using the same vertex twice, harmless but worth knowing about
+
+    def describe(self, model):
+        mesh = model.meshes[self.mesh_index]
+        text = "mesh " + str(self.mesh_index) + " " + repr(mesh.name) + " part " + str(self.part_index) + " " + repr(mesh.parts[self.part_index].label) + ": "
+        problems = list(self.errors)
+        if self.degenerate_triangles > 0: problems.append(str(self.degenerate_triangles) + " degenerate triangles")
+        return text + ", ".join(problems)
+
+# checks every part's index slice against the index buffer and its own vertex range, with one pass over all the indices.
+# returns a part_report for each part with a problem, in mesh/part order
+def validate_model_parts(model):
+    parts = [(mesh_index, part_index, part) for mesh_index, mesh in enumerate(model.meshes) for part_index, part in enumerate(mesh.parts)]
+    if len(parts) == 0: return []
+    first = np.array([part.first_vert_index for mesh_index, part_index, part in parts], dtype=np.int64)
+    last = np.array([part.last_vert_index for mesh_index, part_index, part in parts], dtype=np.int64)
+    offsets = np.array([part.indices_offset for mesh_index, part_index, part in parts], dtype=np.int64)
+    counts = np.array([part.triangles_count for mesh_index, part_index, part in parts], dtype=np.int64) * 3
+    index_count = len(model.indices)
+    bad_range = (first > last) | (last >= model.vert_count)
+    bad_slice = offsets + counts > index_count
+
+    # the index slices of all the parts that fit in the buffer back to back, checked against their vertex range by their lowest and highest index
+    outside = np.zeros(len(parts), dtype=np.int64)
+    degenerates = np.zeros(len(parts), dtype=np.int64)
+    fits = np.flatnonzero(~bad_slice & (counts > 0))
+    if len(fits) > 0:
+        values = np.concatenate([model.indices[offsets[i]:offsets[i]+counts[i]] for i in fits])
+        starts = np.cumsum(counts[fits]) - counts[fits]
+        lowest = np.minimum.reduceat(values, starts).astype(np.int64)
+        highest = np.maximum.reduceat(values, starts).astype(np.int64)
+        # only the parts that go outside get their bad indices counted
+        for j in np.flatnonzero((lowest < first[fits]) | (highest > last[fits])):
+            i = fits[j]
+            part_values = values[starts[j]:starts[j]+counts[i]]
+            outside[i] = np.count_nonzero((part_values < first[i]) | (part_values > last[i]))
+        triangles = values.reshape(-1, 3)
+        degenerate = (triangles[:, 0] == triangles[:, 1]) | (triangles[:, 1] == triangles[:, 2]) | (triangles[:, 0] == triangles[:, 2])
+        degenerates[fits] = np.add.reduceat(degenerate, starts // 3, dtype=np.int64)
+
+    reports = []
+    for i in np.flatnonzero(bad_range | bad_slice | (outside > 0) | (degenerates > 0)):
+        mesh_index, part_index, part = parts[i]
+        report = part_report(mesh_index, part_index)
+        if bad_range[i]: report.errors.append("vertex range " + str(first[i]) + ".." + str(last[i]) + " outside the " + str(model.vert_count) + " vertices")
+        if bad_slice[i]: report.errors.append("indices " + str(offsets[i]) + ".." + str(offsets[i]+counts[i]) + " past the end of the " + str(index_count) + " indices")
+        if outside[i] > 0: report.errors.append(str(outside[i]) + " indices outside its vertex range " + str(first[i]) + ".." + str(last[i]))
+        report.degenerate_triangles = int(degenerates[i])
+        reports.append(report)
+    return reports
+
+# validates the parts of a model that was just read, broken_parts = 'FAIL' raises if any part is broken
+# and 'SKIP' puts them in model.broken_parts. returns excluded_parts with the broken parts added
+def check_model_parts(model, excluded_parts = None, broken_parts = 'FAIL'):
+    with profile_stage("validate"):
+        reports = validate_model_parts(model)
+    # parts that are left out anyway dont matter, even if theyre broken
+    if excluded_parts: reports = [report for report in reports if (report.mesh_index, report.part_index) not in excluded_parts]
+    model.broken_parts = set()
+    for report in reports:
+        if len(report.errors) > 0: model.broken_parts.add((report.mesh_index, report.part_index))
+    if len(model.broken_parts) > 0 and broken_parts == 'FAIL':
+        broken = [report.describe(model) for report in reports if len(report.errors) > 0]
+        raise Exception(str(len(broken)) + " broken parts in " + os.path.basename(model.filepath) + ": " + "; ".join(broken[:5]) + ("; ..." if len(broken) > 5 else ""))
+    for report in reports:
+        if len(report.errors) > 0: print(os.path.basename(model.filepath) + ": skipping " + report.describe(model))
+    degenerate_triangles = sum(report.degenerate_triangles for report in reports)
+    if degenerate_triangles > 0: print(os.path.basename(model.filepath) + ": " + str(degenerate_triangles) + " degenerate triangles")
+    if len(model.broken_parts) > 0: excluded_parts = model.broken_parts | (excluded_parts or set())
+    return excluded_parts
+
+# everything after the header (and bones): vertex block, indices, mesh table and coord data.
+# the vertex block gets skipped over first and decoded last, so with excluded_parts only the vertex ranges of the wanted parts are decoded.
+# decode = False just reads the mesh table, for scanning what's in a file.
+# the parts get validated before the vertices are decoded, see check_model_parts
+def read_model_body(f, model, layout, excluded_parts = None, decode = True, broken_parts = 'FAIL'):
+    vertex_block = f.tell()
+    f.skip(model.vert_stride * model.vert_count)
     # read indices
-    indices = read_model_indices(f)
+    with profile_stage("indices"):
+        indices = read_model_indices(f)
+    model.index_count = len(indices)
     # read objects
-    meshes = read_model_mesh(f)
-    # construct
+    if not decode:
+        with profile_stage("mesh table"):
+            model.meshes = read_model_mesh(f)
+        return
+    model.indices = indices
+    read_model_objects(f, model)
+
+    excluded_parts = check_model_parts(model, excluded_parts, broken_parts)
+
+    vertex_ranges = None
+    if excluded_parts:
+        filter_model_parts(model, excluded_parts)
+        vertex_ranges = [(part.first_vert_index, part.last_vert_index+1) for mesh in model.meshes for part in mesh.parts]
+    # read verts
+    f.seek(vertex_block)
+    with profile_stage("vertices"):
+        model.verts = read_vertex_buffer(f, layout, model.vert_count, vertex_ranges)
+
+def parse_static_model(filepath, excluded_parts = None, decode = True, broken_parts = 'FAIL'):
+    if decode: print("running read_some_data...")
+    f = model_reader(filepath)
+    model = parsed_model()
+    model.filepath = filepath
+    with profile_stage("header"):
+        model.header = read_model_header(f)
+
+    model.vert_stride = f.read_int()
+    vert_byte_length = f.read_int()
+    layout = find_vertex_layout(model.header, False, model.vert_stride)
+    if layout.has('color') and decode: print("vertex colors!!!!")
+    model.vert_count = vert_byte_length // model.vert_stride
+
+    read_model_body(f, model, layout, excluded_parts, decode, broken_parts)
+    f.close()
+    return model
+
+def construct_static_model_steps(model, import_as_single = False, shared_meshes = None, show_bounds = False, optimize = False):
     if import_as_single:
-        blender_verts = []
-        blender_indices = []
-        for vert in verts: blender_verts.append((vert.x, vert.y, vert.z))
-        for i in range(0, len(indices)//3): blender_indices.append((indices[(i*3)], indices[(i*3)+1], indices[(i*3)+2]))
+        yield 0, 1
         bpy_mesh = bpy.data.meshes.new("myMesh")
         obj = bpy.data.objects.new("whole_mesh", bpy_mesh)
         bpy.context.collection.objects.link(obj)
-        bpy_mesh.from_pydata(blender_verts, [], blender_indices)
-    
+        triangles = triangle_view(model.indices)
+        if len(model.broken_parts) > 0:
+            # the vertices of the broken parts werent decoded and their indices can point anywhere, so only the triangles of the parts that are left get built
+            triangles = np.concatenate([triangle_view(model.indices, part.indices_offset, part.triangles_count) for mesh in model.meshes for part in mesh.parts]
+                                       or [np.zeros((0, 3), dtype=model.indices.dtype)])
+        fill_mesh(bpy_mesh, model.verts.positions, triangles)
     else:
-        construct_meshes(meshes, verts, indices, f)
+        yield from construct_meshes_steps(model, None, shared_meshes, show_bounds, optimize)
+
+# one object per model mesh, or with per_file one object for the whole file, instead of one per part.
+# the parts get concatenated with their mesh transforms baked in, and each part label becomes a material slot that its triangles use through material_index
+def construct_merged_model_steps(model, per_file = False, show_bounds = False, optimize = False):
+    debug_bounds = []
+    stats = optimize_stats()
+    parts_total = sum(len(mesh.parts) for mesh in model.meshes)
+    parts_done = 0
+    if per_file: groups = [(os.path.basename(model.filepath), range(len(model.meshes)))]
+    else: groups = [(str(mesh_index+1) + "_" + mesh.name, [mesh_index]) for mesh_index, mesh in enumerate(model.meshes)]
+
+    for name, mesh_indices in groups:
+        slots = {} # part label -> material slot
+        pieces = []
+        vert_base = 0
+        for mesh_index in mesh_indices:
+            mesh = model.meshes[mesh_index]
+            transform = mesh_transform(model.coords[mesh_index])
+            with profile_stage("gather"): local_positions = mesh_local_positions(model, mesh)
+            if show_bounds: debug_bounds += [mesh.bounds, model.coords[mesh_index].bounds]
+            for part in mesh.parts:
+                yield parts_done, parts_total
+                parts_done += 1
+                if show_bounds: debug_bounds.append(part.bounds)
+                positions, triangles, uvs, normals, colors = gather_part(model, mesh, part, local_positions)
+                if optimize:
+                    with profile_stage("optimize"):
+                        triangles, (positions, uvs, normals, colors), vertex_map = optimize_part(triangles, [positions, uvs, normals, colors], stats)
+                with profile_stage("merge"):
+                    slot = slots.setdefault(part.label, len(slots))
+                    pieces.append((transform_points(transform, positions), triangles + vert_base, uvs, transform_normals(transform, normals), colors,
+                                   np.full(len(triangles), slot, dtype=np.int32)))
+                vert_base += len(positions)
+        if len(pieces) == 0: continue
+
+        with profile_stage("merge"):
+            def concatenate(column):
+                if any(piece[column] is None for piece in pieces): return None
+                return np.concatenate([piece[column] for piece in pieces])
+            positions, triangles, uvs, normals, colors, material_indices = [concatenate(column) for column in range(6)]
+        with profile_stage("objects"):
+            bpy_mesh = bpy.data.meshes.new(name)
+            obj = bpy.data.objects.new(name, bpy_mesh)
+            bpy.context.collection.objects.link(obj)
+            for label in slots:
+                mat = bpy.data.materials.get(label)
+                if mat is None: mat = bpy.data.materials.new(label)
+                bpy_mesh.materials.append(mat)
+        fill_mesh(bpy_mesh, positions, triangles, uvs, normals, colors, material_indices)
 
-    f.close()
+    if optimize: print(os.path.basename(model.filepath) + ": optimized " + stats.summary())
+    if len(debug_bounds) > 0:
+        with profile_stage("bounds"): add_bounds_object(os.path.basename(model.filepath) + "_bounds", debug_bounds)
+
+def construct_static_model(model, import_as_single = False, shared_meshes = None, show_bounds = False, optimize = False):
+    for step in construct_static_model_steps(model, import_as_single, shared_meshes, show_bounds, optimize): pass
+
+def read_static_model(context, filepath, import_as_single = False):
+    construct_static_model(parse_static_model(filepath), import_as_single)
     return {'FINISHED'}
 
-class bone_data:
-    pos_x = 0
-    pos_y = 0
-    pos_z = 0
-    unk_uint = 0
-    float_unk1 = 0
-    float_unk2 = 0
-    float_unk3 = 0
-    float_unk4 = 0 # typically 1.0
-    float_unk5 = 0 # typically 1.0
-    float_unk6 = 0 # typically 1.0
-    float_unk7 = 0 # typically 1.0
-    uint_flags = 0
-skinned_model_vertex_size = 32
-class bone_vertex:
-    x = 0.0     # 0x00, float
-    y = 0.0     # 0x04, float
-    z = 0.0     # 0x08, float
-    n_x = 0.0   # 0x0C, uint
-    n_y = 0.0   # 0x10, uint
-    uv_x = 0.0  # 0x14, float16
-    uv_y = 0.0  # 0x16, float16
-    bone_weights = 0 # 0x18, uint
-    bone_indices = 0 # 0x1C, uint
-def read_rigged_model(context, filepath):
-    print("running read_some_data...")
-    f = open(filepath, mode="rb")
-    header = read_model_header(f)
-
-    bone_count = read_uint(f)
-    bone_names = []
-    for i in range(0, bone_count):
-        curr_bone = read_fixed_string(f, 32)
-        bone_names.append(curr_bone)
-    
-    bone_parents = []
-    for i in range(0, bone_count):
-        bone_parents.append(read_int(f)) # first will be -1 for the base bone
-    
+# the 48 byte bone records, as one array per field
+bone_dtype = np.dtype([('position', '>f4', (3,)), ('unk_uint', '>u4'), ('unk_floats', '>f4', (7,)), ('flags', '>u4')]) # floats 4-7 are typically 1.0
+class bone_buffer:
+    __slots__ = ('count', 'positions', 'unk_uints', 'unk_floats', 'flags')
+    def __init__(self, count = 0):
+        self.count = count
+        self.positions = np.zeros((count, 3), dtype=np.float32)
+        self.unk_uints = np.zeros(count, dtype=np.uint32)
+        self.unk_floats = np.zeros((count, 7), dtype=np.float32)
+        self.flags = np.zeros(count, dtype=np.uint32)
+
+def read_bone_buffer(f, count):
+    records = f.read_array(bone_dtype, count)
+    result = bone_buffer()
+    result.count = count
+    result.positions = records['position'].astype(np.float32)
+    result.unk_uints = records['unk_uint'].astype(np.uint32)
+    result.unk_floats = records['unk_floats'].astype(np.float32)
+    result.flags = records['flags'].astype(np.uint32)
+    return result
 
-    # then read the bone orientation things
-    bone_orientations = []
-    for i in range(0, bone_count):
-        orientation = bone_data()
-        orientation.pos_x = read_float(f)
-        orientation.pos_y = read_float(f)
-        orientation.pos_z = read_float(f)
-        orientation.unk_uint = read_uint(f)
-        orientation.float_unk1 = read_float(f)
-        orientation.float_unk2 = read_float(f)
-        orientation.float_unk3 = read_float(f)
-        orientation.float_unk4 = read_float(f)
-        orientation.float_unk5 = read_float(f)
-        orientation.float_unk6 = read_float(f)
-        orientation.float_unk7 = read_float(f)
-        orientation.uint_flags = read_uint(f)
-        bone_orientations.append(orientation)
+def parse_rigged_model(filepath, excluded_parts = None, decode = True, broken_parts = 'FAIL'):
+    if decode: print("running read_some_data...")
+    f = model_reader(filepath)
+    model = parsed_model()
+    model.filepath = filepath
+    model.skinned = True
+    with profile_stage("header"):
+        model.header = read_model_header(f)
+
+    with profile_stage("bones"):
+        bone_count = f.read_uint()
+        # fixed 32 byte names, null padded
+        model.bone_names = [name.split(b'\x00', 1)[0].decode('utf-8') for name in f.read_array('S32', bone_count).tolist()]
+
+        model.bone_parents = f.read_array('>i4', bone_count).astype(np.int32) # first will be -1 for the base bone
+
+        # then read the bone orientation things
+        model.bone_orientations = read_bone_buffer(f, bone_count)
     
-    # then theres a buncha random junk here (8 position floats)
-    unk_pos1 = read_float(f)
-    unk_pos2 = read_float(f)
-    unk_pos3 = read_float(f) 
-    unk_pos4 = read_float(f)
-    unk_pos5 = read_float(f)
-    unk_pos6 = read_float(f)
-    unk_pos7 = read_float(f)
-    unk_pos8 = read_float(f)
-
-    vert_stride = read_int(f)
-    vert_byte_length = read_int(f)
-    # error checking
-    vert_padding = vert_stride - skinned_model_vertex_size
-    if vert_padding < 0: raise Exception("vertex stride is smaller than regular size (we'll lose vertex data)")
-    # read verts
-    vert_count = vert_byte_length // vert_stride
-    verts = []
-    for i in range(0, vert_count):
-        vert = bone_vertex()
-        vert.x = read_float(f)
-        vert.y = read_float(f)
-        vert.z = read_float(f)
-        vert.n_x = read_norm(f)
-        vert.n_y = read_norm(f)
-        vert.uv_x = read_float16(f)
-        vert.uv_y = read_float16(f)
-        vert.bone_weights = read_uint(f)
-        vert.bone_indices = read_uint(f)
-        verts.append(vert)
-        # skip padding
-        if vert_padding != 0: f.read(vert_padding)
+        # then theres a buncha random junk here (8 position floats)
+        unk_pos = f.read_struct(bone_tail_struct)
 
-    # read indices
-    indices = read_model_indices(f)
-    # read objects
-    meshes = read_model_mesh(f)
-    # now we can load all this into blender
-    construct_meshes(meshes, verts, indices, f, bone_count, bone_names, bone_orientations, bone_parents)
+    model.vert_stride = f.read_int()
+    vert_byte_length = f.read_int()
+    layout = find_vertex_layout(model.header, True, model.vert_stride)
+    model.vert_count = vert_byte_length // model.vert_stride
+
+    read_model_body(f, model, layout, excluded_parts, decode, broken_parts)
     f.close()
-    return {'FINISHED'}
+    return model
 
+def construct_rigged_model_steps(model, show_bounds = False, optimize = False):
+    # now we can load all this into blender
+    with profile_stage("armature"):
+        armature = build_armature(model.bone_names, model.bone_orientations, model.bone_parents)
+    yield from construct_meshes_steps(model, armature, None, show_bounds, optimize)
 
+def construct_rigged_model(model, show_bounds = False, optimize = False):
+    for step in construct_rigged_model_steps(model, show_bounds, optimize): pass
 
+def read_rigged_model(context, filepath):
+    construct_rigged_model(parse_rigged_model(filepath))
+    return {'FINISHED'}
 
 
-# ImportHelper is a helper class, defines filename and
-# invoke() function which calls the file selector.
-from bpy_extras.io_utils import ImportHelper
-from bpy.props import StringProperty, BoolProperty, EnumProperty
-from bpy.types import Operator
-class ImportSomeData(Operator, ImportHelper):
-    """Import model files from Hydro Thunder Hurricane"""
-    bl_idname = "import_test.some_data"  # important since its how bpy.ops.import_test.some_data is constructed
-    bl_label = "Import Hydro Thunder models"
-    # ImportHelper mix-in class uses this.
-    #filename_ext = ".txt"
-    filter_glob: StringProperty(
-        default="*.dat",
-        options={'HIDDEN'},
-        maxlen=255,)  # Max internal buffer length, longer would be clamped.
-
-    type: EnumProperty(
-        name="Import type",
-        description="Choose type of model to import",
-        items=(
-            ('OPT_A', "Static model", "Import a static model"),
-            ('OPT_C', "Static model (single mesh)", "Import a static model"),
-            ('OPT_B', "Skinned model", "Import a skinned model"),
-        ),
-        default='OPT_A',)
+# ---- parse cache ----
+
+# bump this whenever parsing changes, so older cache entries stop matching
+parser_version = 5
+default_cache_dir = os.path.join(tempfile.gettempdir(), "hydro_thunder_cache")
+default_cache_size = 2 * 1024**3
+
+bounds_fields = ('min_x', 'min_y', 'min_z', 'yaw', 'max_x', 'max_y', 'max_z', 'pitch')
+vertex_buffer_arrays = ('positions', 'normals', 'uvs', 'colors', 'bone_weights', 'bone_indices')
+bone_buffer_arrays = ('positions', 'unk_uints', 'unk_floats', 'flags')
+
+def record_values(record, fields): return [getattr(record, field) for field in fields]
+def fill_record(record, fields, values):
+    for field, value in zip(fields, values): setattr(record, field, value)
+    return record
+
+# flattens a parsed model into arrays plus a json description of the small records, for np.savez
+def model_to_arrays(model):
+    meta = {
+        "skinned": model.skinned,
+        "vert_stride": model.vert_stride, "vert_count": model.vert_count, "index_count": model.index_count,
+        "signatures": [(sig.signature, sig.unk) for sig in model.header.signatures],
+        "meshes": [{
+            "name": mesh.name,
+            "unkers": [(unker.unk1, unker.unk2, unker.unk3, unker.unk4) for unker in mesh.unkers],
+            "parts": [(part.label, part.first_vert_index, part.last_vert_index, part.indices_offset, part.triangles_count, record_values(part.bounds, bounds_fields)) for part in mesh.parts],
+            "bounds": record_values(mesh.bounds, bounds_fields),
+            "first_vert_index": mesh.first_vert_index, "indices_offset": mesh.indices_offset, "vert_count": mesh.vert_count,
+        } for mesh in model.meshes],
+        "coord_bounds": [record_values(coord.bounds, bounds_fields) for coord in model.coords],
+        "bone_names": model.bone_names,
+    }
+    arrays = {"meta": np.array(json.dumps(meta)), "indices": model.indices, "bone_parents": model.bone_parents,
+              "coord_matrices": np.array([coord.matrix for coord in model.coords], dtype=np.float32).reshape(-1, 4, 4)}
+    for name in vertex_buffer_arrays:
+        if getattr(model.verts, name) is not None: arrays[name] = getattr(model.verts, name)
+    for name in bone_buffer_arrays: arrays["bone_" + name] = getattr(model.bone_orientations, name)
+    return arrays
+
+def model_from_arrays(filepath, arrays):
+    meta = json.loads(str(arrays["meta"]))
+    model = parsed_model()
+    model.filepath = filepath
+    model.skinned = meta["skinned"]
+    model.vert_stride = meta["vert_stride"]
+    model.vert_count = meta["vert_count"]
+    model.index_count = meta["index_count"]
+    model.header = model_header()
+    model.header.signatures = [model_header_signature(*values) for values in meta["signatures"]]
+    model.header.sig_count = len(model.header.signatures)
+    model.verts = vertex_buffer()
+    for name in vertex_buffer_arrays:
+        if name in arrays: setattr(model.verts, name, arrays[name])
+    model.verts.count = len(model.verts.positions)
+    model.indices = arrays["indices"]
+    model.meshes = []
+    for values in meta["meshes"]:
+        mesh = model_mesh()
+        mesh.name = values["name"]
+        mesh.unkers = [model_mesh_unk(*unker) for unker in values["unkers"]]
+        mesh.unk_count = len(mesh.unkers)
+        mesh.parts = []
+        for label, first_vert_index, last_vert_index, indices_offset, triangles_count, bounds in values["parts"]:
+            part = fill_record(model_mesh_part(), ('label', 'first_vert_index', 'last_vert_index', 'indices_offset', 'triangles_count'), (label, first_vert_index, last_vert_index, indices_offset, triangles_count))
+            part.bounds = object_bounds(*bounds)
+            mesh.parts.append(part)
+        mesh.part_count = len(mesh.parts)
+        mesh.bounds = object_bounds(*values["bounds"])
+        mesh.first_vert_index = values["first_vert_index"]
+        mesh.indices_offset = values["indices_offset"]
+        mesh.vert_count = values["vert_count"]
+        model.meshes.append(mesh)
+    model.coords = []
+    for matrix, bounds in zip(arrays["coord_matrices"], meta["coord_bounds"]):
+        coord = model_coord_data()
+        coord.matrix = matrix
+        coord.bounds = object_bounds(*bounds)
+        model.coords.append(coord)
+    model.bone_names = meta["bone_names"]
+    model.bone_parents = arrays["bone_parents"]
+    model.bone_orientations = bone_buffer()
+    for name in bone_buffer_arrays: setattr(model.bone_orientations, name, arrays["bone_" + name])
+    model.bone_orientations.count = len(model.bone_parents)
+    return model
+
+# hash and size of the contents of a file
+def file_digest(filepath):
+    digest = hashlib.blake2b(digest_size=20)
+    size = 0
+    with open(filepath, mode="rb") as file:
+        for chunk in iter(lambda: file.read(1024*1024), b''):
+            digest.update(chunk)
+            size += len(chunk)
+    return digest.hexdigest(), size
+
+# decoded models on disk, one .npz per file named after the hash of its contents.
+# hits get their mtime bumped, so evict can drop the least recently used entries once the folder grows past max_size
+class model_cache:
+    def __init__(self, directory = default_cache_dir, max_size = default_cache_size):
+        self.directory = directory
+        self.max_size = max_size
+
+    def key(self, filepath, skinned):
+        digest, size = file_digest(filepath)
+        return digest + "_" + str(size) + "_v" + str(parser_version) + ("_skinned" if skinned else "")
+
+    def path(self, key): return os.path.join(self.directory, key + ".npz")
+
+    # any problem with an entry makes it a miss, broken entries get removed so they're written again
+    def load(self, filepath, key):
+        path = self.path(key)
+        try:
+            with np.load(path, allow_pickle=False) as arrays:
+                model = model_from_arrays(filepath, {name: arrays[name] for name in arrays.files})
+        except OSError:
+            return None # not there, or the folder cant be read
+        except Exception as e:
+            print("warning: dropping broken cache entry " + path + " (" + str(e) + ")")
+            try: os.remove(path)
+            except OSError: pass
+            return None
+        try: os.utime(path)
+        except OSError: pass
+        return model
+
+    # the cache is only a speedup, if the entry cant be written the model is still used and it just gets parsed again next time
+    def store(self, key, model):
+        # write next to the final name and rename it over, so other processes never see half an entry
+        temp_path = self.path(key) + "." + str(os.getpid()) + ".tmp"
+        try:
+            os.makedirs(self.directory, exist_ok=True)
+            with open(temp_path, mode="wb") as file:
+                np.savez(file, **model_to_arrays(model))
+            os.replace(temp_path, self.path(key))
+        except OSError as e:
+            print("warning: couldnt write cache entry " + self.path(key) + " (" + str(e) + ")")
+            try: os.remove(temp_path)
+            except OSError: pass
+
+    def evict(self):
+        if not os.path.isdir(self.directory): return
+        entries = []
+        try:
+            for entry in os.scandir(self.directory):
+                if entry.name.endswith(".npz"):
+                    try: stat = entry.stat()
+                    except OSError: continue # another process got rid of it first
+                    entries.append((stat.st_mtime, stat.st_size, entry.path))
+        except OSError as e:
+            print("warning: couldnt clean up the cache folder " + self.directory + " (" + str(e) + ")")
+            return
+        total = sum(size for mtime, size, path in entries)
+        for mtime, size, path in sorted(entries):
+            if total <= self.max_size: break
+            try: os.remove(path)
+            except OSError: continue
+            total -= size
+
+
+# cache is an optional model_cache, decoded files are taken from it when the contents havent changed.
+# excluded_parts is an optional set of (mesh index, part index) to leave out, partial parses dont get cached.
+# profile is an optional import_profile to record the parse stages into, it comes back as model.profile.
+# broken_parts is 'FAIL' or 'SKIP', see check_model_parts. files with skipped parts dont get cached either
+def parse_model(filepath, skinned = False, cache = None, excluded_parts = None, profile = None, broken_parts = 'FAIL'):
+    with profiling(profile):
+        model = None
+        if cache is not None:
+            with profile_stage("cache key"): key = cache.key(filepath, skinned)
+            with profile_stage("cache load"): model = cache.load(filepath, key)
+            # entries are only written for files that validated without broken parts, so hits dont get checked again
+            if model is not None and excluded_parts: filter_model_parts(model, excluded_parts)
+        if model is None:
+            if skinned: model = parse_rigged_model(filepath, excluded_parts, broken_parts=broken_parts)
+            else: model = parse_static_model(filepath, excluded_parts, broken_parts=broken_parts)
+            if cache is not None and not excluded_parts and len(model.broken_parts) == 0:
+                with profile_stage("cache store"): cache.store(key, model)
+    model.profile = profile
+    return model
+
+# only reads the header and mesh table, vertex and index data are skipped over
+def scan_model(filepath, skinned = False):
+    if skinned: return parse_rigged_model(filepath, decode=False)
+    return parse_static_model(filepath, decode=False)
+
+# parses the files in a process pool when theres more than one, results come back in the same order as filepaths.
+# if the pool cant be used (no fork support, script not importable by the workers) the files are parsed here instead.
+# excluded_parts maps filepaths to the parts to leave out of them (see parse_model).
+# profile gives every model its own import_profile (with tracemalloc peaks if trace_memory is set), timed in whichever process parsed it
+def parse_models(filepaths, skinned = False, use_multiprocessing = True, cache = None, excluded_parts = {}, profile = False, trace_memory = False, broken_parts = 'FAIL'):
+    def new_profile(): return import_profile(trace_memory) if profile else None
+    done = 0
+    pool = None
+    if use_multiprocessing and len(filepaths) > 1:
+        try:
+            pool = concurrent.futures.ProcessPoolExecutor(max_workers=min(len(filepaths), os.cpu_count() or 1))
+        except OSError as e:
+            print("process pool failed (" + str(e) + "), parsing the files one at a time")
+    if pool is not None:
+        jobs = []
+        try:
+            jobs = [pool.submit(parse_model, filepath, skinned, cache, excluded_parts.get(filepath), new_profile(), broken_parts) for filepath in filepaths]
+            for job in jobs:
+                # errors from parsing a file come straight through, only a pool that stopped working falls back
+                yield job.result()
+                done += 1
+        except (pickle.PicklingError, concurrent.futures.BrokenExecutor) as e:
+            print("process pool failed (" + str(e) + "), parsing the remaining files one at a time")
+        finally:
+            # drop the files nobody started on yet if the import gets cancelled
+            for job in jobs: job.cancel()
+            pool.shutdown(wait=True)
+    for filepath in filepaths[done:]:
+        yield parse_model(filepath, skinned, cache, excluded_parts.get(filepath), new_profile(), broken_parts)
+    if cache is not None: cache.evict()
+
+
+
+
+# ---- headless conversion ----
+
+# arrays for one part, ready to write out: transformed into world space, so every format gets the same result as the blender import
+def export_part(model, mesh_index, part):
+    mesh = model.meshes[mesh_index]
+    transform = mesh_transform(model.coords[mesh_index])
+    positions, triangles, uvs, normals, colors = gather_part(model, mesh, part)
+    return transform_points(transform, positions), triangles, uvs, transform_normals(transform, normals), colors
+
+def write_obj(model, out_path):
+    with open(out_path, "w") as out:
+        out.write("# converted from " + os.path.basename(model.filepath) + "\n")
+        vert_base = 1
+        for mesh_index, mesh in enumerate(model.meshes):
+            for part_index, part in enumerate(mesh.parts):
+                positions, triangles, uvs, normals, colors = export_part(model, mesh_index, part)
+                out.write("o " + str(mesh_index+1) + "_" + str(part_index+1) + "_" + mesh.name + "_" + part.label + "\n")
+                out.write("usemtl " + part.label + "\n")
+                if colors is not None: np.savetxt(out, np.hstack((positions, colors[:, :3])), fmt="v %.6f %.6f %.6f %.4f %.4f %.4f")
+                else: np.savetxt(out, positions, fmt="v %.6f %.6f %.6f")
+                np.savetxt(out, uvs, fmt="vt %.6f %.6f")
+                np.savetxt(out, normals, fmt="vn %.6f %.6f %.6f")
+                # position, uv and normal indices are all the same
+                np.savetxt(out, np.repeat(triangles + vert_base, 3, axis=1), fmt="f %d/%d/%d %d/%d/%d %d/%d/%d")
+                vert_base += len(positions)
+
+def write_glb(model, out_path):
+    gltf = {"asset": {"version": "2.0", "generator": "Hydro Thunder dat converter"},
+            "scene": 0, "scenes": [{"nodes": []}], "nodes": [], "meshes": [], "materials": [],
+            "accessors": [], "bufferViews": [], "buffers": []}
+    blob = bytearray()
+    def add_accessor(array, component_type, accessor_type, target, with_bounds = False):
+        while len(blob) % 4 != 0: blob.append(0)
+        data = np.ascontiguousarray(array)
+        gltf["bufferViews"].append({"buffer": 0, "byteOffset": len(blob), "byteLength": data.nbytes, "target": target})
+        blob.extend(data.tobytes())
+        accessor = {"bufferView": len(gltf["bufferViews"])-1, "componentType": component_type, "count": len(data), "type": accessor_type}
+        if with_bounds:
+            accessor["min"] = data.min(axis=0).tolist()
+            accessor["max"] = data.max(axis=0).tolist()
+        gltf["accessors"].append(accessor)
+        return len(gltf["accessors"])-1
+
+    materials = {}
+    for mesh_index, mesh in enumerate(model.meshes):
+        primitives = []
+        for part in mesh.parts:
+            positions, triangles, uvs, normals, colors = export_part(model, mesh_index, part)
+            if len(positions) == 0 or len(triangles) == 0: continue
+            if part.label not in materials:
+                materials[part.label] = len(gltf["materials"])
+                gltf["materials"].append({"name": part.label})
+            attributes = {
+                "POSITION":   add_accessor(positions.astype(np.float32), 5126, "VEC3", 34962, True),
+                "NORMAL":     add_accessor(normals.astype(np.float32), 5126, "VEC3", 34962),
+                "TEXCOORD_0": add_accessor(uvs.astype(np.float32), 5126, "VEC2", 34962)}
+            if colors is not None: attributes["COLOR_0"] = add_accessor(colors.astype(np.float32), 5126, "VEC4", 34962)
+            primitives.append({"attributes": attributes, "material": materials[part.label],
+                               "indices": add_accessor(triangles.astype(np.uint32).ravel(), 5125, "SCALAR", 34963)})
+        if len(primitives) == 0: continue
+        gltf["meshes"].append({"name": mesh.name, "primitives": primitives})
+        gltf["nodes"].append({"name": mesh.name, "mesh": len(gltf["meshes"])-1})
+        gltf["scenes"][0]["nodes"].append(len(gltf["nodes"])-1)
+    while len(blob) % 4 != 0: blob.append(0)
+    gltf["buffers"].append({"byteLength": len(blob)})
+    for key in ("meshes", "nodes", "materials", "accessors", "bufferViews"):
+        if len(gltf[key]) == 0: del gltf[key]
+
+    json_chunk = json.dumps(gltf, separators=(',', ':')).encode('utf-8')
+    json_chunk += b' ' * (-len(json_chunk) % 4)
+    with open(out_path, "wb") as out:
+        out.write(struct.pack('<4sII', b'glTF', 2, 12 + 8 + len(json_chunk) + 8 + len(blob)))
+        out.write(struct.pack('<I4s', len(json_chunk), b'JSON'))
+        out.write(json_chunk)
+        out.write(struct.pack('<I4s', len(blob), b'BIN\x00'))
+        out.write(blob)
+
+model_writers = {
+    "glb": write_glb,
+    "obj": write_obj,
+}
+
+# parses and writes one file, runs in the worker processes
+def convert_model(filepath, out_path, format = "glb", skinned = False, cache = None, broken_parts = 'FAIL'):
+    model = parse_model(filepath, skinned, cache, broken_parts=broken_parts)
+    os.makedirs(os.path.dirname(out_path) or ".", exist_ok=True)
+    model_writers[format](model, out_path)
+    return len(model.verts.positions), len(model.indices) // 3
+
+def find_model_files(paths):
+    result = []
+    for path in paths:
+        if os.path.isdir(path):
+            for root, dirs, files in os.walk(path):
+                dirs.sort()
+                for name in sorted(files):
+                    if name.lower().endswith(".dat"): result.append((os.path.join(root, name), os.path.relpath(os.path.join(root, name), path)))
+        else:
+            result.append((path, os.path.basename(path)))
+    return result
+
+def convert_main(argv):
+    parser = argparse.ArgumentParser(description="Convert Hydro Thunder Hurricane .dat models without blender")
+    parser.add_argument("inputs", nargs="+", help=".dat files, or folders to search for them")
+    parser.add_argument("-o", "--output", default=".", help="output folder, the input folder layout is kept")
+    parser.add_argument("-f", "--format", choices=sorted(model_writers), default="glb")
+    parser.add_argument("--skinned", action="store_true", help="read the files as skinned models (only the mesh is converted, not the bones)")
+    parser.add_argument("-j", "--jobs", type=int, default=os.cpu_count() or 1, help="number of worker processes")
+    parser.add_argument("--cache", metavar="DIR", help="reuse decoded files from this cache folder")
+    parser.add_argument("--skip-broken-parts", action="store_true", help="leave out parts with bad index or vertex ranges instead of failing the file")
+    args = parser.parse_args(argv)
+    cache = model_cache(args.cache) if args.cache else None
+
+    files = find_model_files(args.inputs)
+    out_paths = [os.path.join(args.output, os.path.splitext(relpath)[0] + "." + args.format) for filepath, relpath in files]
+    failed = 0
+    with concurrent.futures.ProcessPoolExecutor(max_workers=max(1, args.jobs)) as pool:
+        broken_parts = 'SKIP' if args.skip_broken_parts else 'FAIL'
+        jobs = {pool.submit(convert_model, filepath, out_path, args.format, args.skinned, cache, broken_parts): filepath for (filepath, relpath), out_path in zip(files, out_paths)}
+        for job in concurrent.futures.as_completed(jobs):
+            try:
+                vert_count, triangle_count = job.result()
+                print(jobs[job] + ": " + str(vert_count) + " verts, " + str(triangle_count) + " triangles")
+            except Exception as e:
+                failed += 1
+                print(jobs[job] + ": failed, " + str(e))
+    if cache is not None: cache.evict()
+    print("converted " + str(len(files) - failed) + " of " + str(len(files)) + " files")
+    return 1 if failed > 0 else 0
+
+
+
+
+# the blender side, only available when running inside blender
+if bpy is not None:
+    # ImportHelper is a helper class, defines filename and
+    # invoke() function which calls the file selector.
+    from bpy_extras.io_utils import ImportHelper
+    from bpy.props import StringProperty, BoolProperty, EnumProperty, IntProperty
+    from bpy.types import Operator, PropertyGroup, UIList
+
+    # one row of the part list, filled in by scanning the selected files
+    class ImportPartItem(PropertyGroup):
+        filepath: StringProperty()
+        mesh_index: IntProperty()
+        part_index: IntProperty()
+        selected: BoolProperty(name="Import", default=True)
+
+    class IMPORT_UL_hydro_thunder_parts(UIList):
+        def draw_item(self, context, layout, data, item, icon, active_data, active_propname, index):
+            layout.prop(item, "selected", text=item.name)
+
+    # the blender objects of imported files saved as .blend libraries, so the next import of an unchanged file just appends (or links) them.
+    # the libraries are named after the hash of the source file plus the import options, the manifest remembers the hash of each
+    # source file with its mtime and size, so unchanged files dont have to be read again to find their library
+    class blend_library_cache:
+        def __init__(self, directory):
+            self.directory = directory
+            self.manifest_path = os.path.join(directory, "manifest.json")
+            self.manifest = {}
+            try:
+                with open(self.manifest_path) as file: self.manifest = json.load(file)
+            except (OSError, ValueError): pass
+            self.changed = False
+
+        def source_digest(self, filepath):
+            stat = os.stat(filepath)
+            entry = self.manifest.get(os.path.abspath(filepath))
+            if entry is not None and entry["mtime"] == stat.st_mtime and entry["size"] == stat.st_size: return entry["hash"]
+            digest, size = file_digest(filepath)
+            self.manifest[os.path.abspath(filepath)] = {"mtime": stat.st_mtime, "size": stat.st_size, "hash": digest}
+            self.changed = True
+            return digest
+
+        def path(self, filepath, options):
+            return os.path.join(self.directory, self.source_digest(filepath) + "_" + options + ".blend")
+
+        # path of the library for this file and options, None if it hasnt been converted yet
+        def lookup(self, filepath, options):
+            path = self.path(filepath, options)
+            return path if os.path.isfile(path) else None
+
+        def load(self, path, link = False):
+            with bpy.data.libraries.load(path, link=link) as (data_from, data_to):
+                data_to.objects = data_from.objects
+            for obj in data_to.objects:
+                if obj is None: continue
+                if not link: obj.use_fake_user = False
+                bpy.context.collection.objects.link(obj)
+
+        # objects get saved with everything they use (meshes, materials, armatures)
+        def store(self, filepath, options, objects):
+            os.makedirs(self.directory, exist_ok=True)
+            path = self.path(filepath, options)
+            temp_path = path + "." + str(os.getpid()) + ".tmp.blend"
+            bpy.data.libraries.write(temp_path, set(objects), fake_user=True)
+            os.replace(temp_path, path)
+
+        def save_manifest(self):
+            if not self.changed: return
+            os.makedirs(self.directory, exist_ok=True)
+            with open(self.manifest_path, mode="w") as file: json.dump(self.manifest, file, indent=1)
+            self.changed = False
+
+    class ImportSomeData(Operator, ImportHelper):
+        """Import model files from Hydro Thunder Hurricane"""
+        bl_idname = "import_test.some_data"  # important since its how bpy.ops.import_test.some_data is constructed
+        bl_label = "Import Hydro Thunder models"
+        # ImportHelper mix-in class uses this.
+        #filename_ext = ".txt"
+        filter_glob: StringProperty(
+            default="*.dat",
+            options={'HIDDEN'},
+            maxlen=255,)  # Max internal buffer length, longer would be clamped.
+
+        type: EnumProperty(
+            name="Import type",
+            description="Choose type of model to import",
+            items=(
+                ('OPT_A', "Static model", "Import a static model"),
+                ('OPT_C', "Static model (single mesh)", "Import a static model"),
+                ('OPT_D', "Static model (merged per mesh)", "Import a static model as one object per mesh, with a material slot per part label"),
+                ('OPT_E', "Static model (merged per file)", "Import a static model as one object per file, with a material slot per part label"),
+                ('OPT_B', "Skinned model", "Import a skinned model"),
+            ),
+            default='OPT_A',)
     
-    # Enable multiple file selection
-    files: CollectionProperty(
-        type=bpy.types.OperatorFileListElement,
-        options={'HIDDEN', 'SKIP_SAVE'},)
-    # Store the folder path
-    directory: StringProperty(
-        subtype='DIR_PATH',)
-
-
-    def execute(self, context):
-        for file in self.files:
-            filepath = os.path.join(self.directory, file.name)
-            print(filepath)
-            if self.type == 'OPT_A':
-                read_static_model(context, filepath, False)
-            elif self.type == 'OPT_C':
-                read_static_model(context, filepath, True)
-            elif self.type == "OPT_B":
-                read_rigged_model(context, filepath)
-        return {'FINISHED'}
-# Only needed if you want to add into a dynamic menu.
-def menu_func_import(self, context):
-    self.layout.operator(ImportSomeData.bl_idname, text="Hydro Thunder Import")
-# Register and add to the "file selector" menu (required to use F3 search "Text Import Operator" for quick access).
-def register():
-    bpy.utils.register_class(ImportSomeData)
-    bpy.types.TOPBAR_MT_file_import.append(menu_func_import)
-def unregister():
-    bpy.utils.unregister_class(ImportSomeData)
-    bpy.types.TOPBAR_MT_file_import.remove(menu_func_import)
+        # Enable multiple file selection
+        files: CollectionProperty(
+            type=bpy.types.OperatorFileListElement,
+            options={'HIDDEN', 'SKIP_SAVE'},)
+        # Store the folder path
+        directory: StringProperty(
+            subtype='DIR_PATH',)
+
+
+        use_multiprocessing: BoolProperty(
+            name="Parallel parsing",
+            description="Parse the selected files in a process pool, only the blender objects get created one file at a time",
+            default=True,)
+        use_cache: BoolProperty(
+            name="Cache parsed files",
+            description="Keep decoded files in a cache folder, unchanged files are loaded from there instead of being parsed again",
+            default=True,)
+        cache_directory: StringProperty(
+            name="Cache folder",
+            default=default_cache_dir,
+            subtype='DIR_PATH',)
+        use_blend_cache: BoolProperty(
+            name="Cache blender objects",
+            description="Save the objects of each imported file as a .blend in the cache folder, unchanged files are appended from there instead of being converted again",
+            default=False,)
+        link_cached: BoolProperty(
+            name="Link cached files",
+            description="Link the cached objects instead of appending them (faster and smaller, but they cant be edited)",
+            default=False,)
+
+
+        share_duplicate_meshes: BoolProperty(
+            name="Share duplicate meshes",
+            description="Parts with identical geometry and material use one mesh, as linked duplicates (not for skinned or merged imports)",
+            default=True,)
+        optimize_meshes: BoolProperty(
+            name="Optimize meshes",
+            description="Drop unused vertices, weld identical ones and renumber the rest in draw order before building each mesh",
+            default=False,)
+        show_bounds: BoolProperty(
+            name="Show bounds",
+            description="Add a wireframe object per file with the mesh and part bounding boxes, for debugging",
+            default=False,)
+        broken_parts: EnumProperty(
+            name="Broken parts",
+            description="What to do with parts whose index or vertex ranges dont fit the file",
+            items=(
+                ('SKIP', "Skip", "Leave the broken parts out and import the rest of the file"),
+                ('FAIL', "Fail", "Stop the import at the first file with a broken part"),
+            ),
+            default='SKIP',)
+        use_modal: BoolProperty(
+            name="Show progress",
+            description="Import in the background with a progress bar, press Esc to stop after the current part",
+            default=True,
+            options={'SKIP_SAVE'},)
+        use_profiling: BoolProperty(
+            name="Profile import",
+            description="Time every stage of the import and print a table per file and for the whole batch to the console",
+            default=False,)
+        profile_memory: BoolProperty(
+            name="Profile memory",
+            description="Also record the peak memory of each stage with tracemalloc, this slows the import down a lot",
+            default=False,)
+        profile_report_path: StringProperty(
+            name="Profile report",
+            description="Optional json file to write the timings to",
+            default="",
+            subtype='FILE_PATH',)
+
+        # parts of the selected files, untick them to leave them out of the import
+        parts: CollectionProperty(
+            type=ImportPartItem,
+            options={'HIDDEN', 'SKIP_SAVE'},)
+        active_part_index: IntProperty(
+            options={'HIDDEN', 'SKIP_SAVE'},)
+        scanned_files: StringProperty(
+            options={'HIDDEN', 'SKIP_SAVE'},)
+
+
+        def selected_filepaths(self):
+            return [os.path.join(self.directory, file.name) for file in self.files if file.name != ""]
+
+        # the file browser calls this whenever the selection changes, rescan the part list if the files did
+        def check(self, context):
+            filepaths = self.selected_filepaths()
+            scan_key = self.type + "|" + "|".join(filepaths)
+            if scan_key == self.scanned_files: return False
+            self.scanned_files = scan_key
+            self.parts.clear()
+            if self.type == 'OPT_C': return True # single mesh imports dont go by parts
+            for filepath in filepaths:
+                try: model = scan_model(filepath, self.type == "OPT_B")
+                except Exception: continue # not a model of this type
+                for mesh_index, mesh in enumerate(model.meshes):
+                    for part_index, part in enumerate(mesh.parts):
+                        item = self.parts.add()
+                        item.name = os.path.basename(filepath) + ": " + mesh.name + " / " + part.label + " (" + str(part.triangles_count) + " tris)"
+                        item.filepath = filepath
+                        item.mesh_index = mesh_index
+                        item.part_index = part_index
+            return True
+
+        def draw(self, context):
+            layout = self.layout
+            for name in ("type", "use_multiprocessing", "use_cache", "cache_directory", "use_blend_cache", "link_cached", "share_duplicate_meshes", "optimize_meshes", "show_bounds", "broken_parts", "use_modal", "use_profiling"):
+                layout.prop(self, name)
+            if self.use_profiling:
+                layout.prop(self, "profile_memory")
+                layout.prop(self, "profile_report_path")
+            if len(self.parts) > 0:
+                layout.label(text="Parts")
+                layout.template_list("IMPORT_UL_hydro_thunder_parts", "", self, "parts", self, "active_part_index")
+
+        # {filepath: {(mesh index, part index)}} of the unticked parts
+        def excluded_parts(self):
+            result = {}
+            if self.type == 'OPT_C': return result
+            for item in self.parts:
+                if not item.selected: result.setdefault(item.filepath, set()).add((item.mesh_index, item.part_index))
+            return result
+
+
+        # everything that changes the objects an import makes, a cached .blend only gets reused with the same options
+        def blend_cache_options(self, filepath, excluded_parts):
+            options = [self.type, self.share_duplicate_meshes, self.optimize_meshes, self.show_bounds, self.broken_parts, sorted(excluded_parts.get(filepath, ())), parser_version, bpy.app.version_string]
+            return hashlib.blake2b(repr(options).encode('utf-8'), digest_size=8).hexdigest()
+
+        # the whole import as one generator, yields the progress in files (file index + fraction of its parts)
+        def import_steps(self, filepaths):
+            cache = model_cache(self.cache_directory) if self.use_cache else None
+            blend_cache = blend_library_cache(os.path.join(self.cache_directory, "blend")) if self.use_blend_cache else None
+            shared_meshes = {} if self.share_duplicate_meshes else None
+            excluded_parts = self.excluded_parts()
+            try:
+                # files converted before come straight out of their .blend, only the rest gets parsed and built
+                if blend_cache is not None:
+                    remaining = []
+                    for filepath in filepaths:
+                        library = blend_cache.lookup(filepath, self.blend_cache_options(filepath, excluded_parts))
+                        if library is None:
+                            remaining.append(filepath)
+                            continue
+                        print(filepath + " (cached)")
+                        blend_cache.load(library, self.link_cached)
+                        self.files_done += 1
+                        yield self.files_done
+                    filepaths = remaining
+                yield from self.convert_steps(filepaths, cache, blend_cache, shared_meshes, excluded_parts)
+            finally:
+                if blend_cache is not None: blend_cache.save_manifest()
+
+        def convert_steps(self, filepaths, cache, blend_cache, shared_meshes, excluded_parts):
+            files_before = self.files_done
+            # parsing doesnt touch bpy, so only the construction has to happen here on the main thread
+            models = parse_models(filepaths, self.type == "OPT_B", self.use_multiprocessing, cache, excluded_parts, self.use_profiling, self.profile_memory, self.broken_parts)
+            for file_index, model in enumerate(models, files_before):
+                print(model.filepath)
+                if model.profile is not None: self.profiles.append((model.filepath, model.profile))
+                if self.type == 'OPT_A':
+                    steps = construct_static_model_steps(model, False, shared_meshes, self.show_bounds, self.optimize_meshes)
+                elif self.type == 'OPT_C':
+                    steps = construct_static_model_steps(model, True)
+                elif self.type == 'OPT_D' or self.type == 'OPT_E':
+                    steps = construct_merged_model_steps(model, self.type == 'OPT_E', self.show_bounds, self.optimize_meshes)
+                elif self.type == "OPT_B":
+                    steps = construct_rigged_model_steps(model, self.show_bounds, self.optimize_meshes)
+                objects_before = set(bpy.data.objects) if blend_cache is not None else None
+                # the construction stages go into the same profile as the parse
+                with profiling(model.profile):
+                    for parts_done, parts_total in steps:
+                        yield file_index + parts_done / max(parts_total, 1)
+                    if blend_cache is not None:
+                        with profile_stage("blend cache"):
+                            blend_cache.store(model.filepath, self.blend_cache_options(model.filepath, excluded_parts), set(bpy.data.objects) - objects_before)
+                self.files_done = file_index + 1
+
+        # prints the stage timings of each file (slowest file first) and of the whole batch, and writes them to profile_report_path.
+        # files parsed in the process pool were timed in parallel, so the batch total can be more than the time the import took
+        def report_profiles(self):
+            if len(self.profiles) == 0: return
+            batch = import_profile()
+            for filepath, profile in sorted(self.profiles, key=lambda item: -item[1].total()):
+                print(os.path.basename(filepath) + ": " + "%.2f" % (profile.total()*1000.0) + " ms")
+                print(profile.table())
+                batch.merge(profile)
+            print("all " + str(len(self.profiles)) + " files:")
+            print(batch.table())
+            if self.profile_report_path != "":
+                with open(bpy.path.abspath(self.profile_report_path), mode="w") as file:
+                    json.dump({"files": {filepath: profile.to_json() for filepath, profile in self.profiles}, "batch": batch.to_json()}, file, indent=1)
+
+        def execute(self, context):
+            filepaths = self.selected_filepaths()
+            self.files_total = len(filepaths)
+            self.files_done = 0
+            self.profiles = []
+            self.steps = self.import_steps(filepaths)
+            if not self.use_modal or bpy.app.background or context.window is None:
+                for progress in self.steps: pass
+                self.report_profiles()
+                return {'FINISHED'}
+
+            wm = context.window_manager
+            wm.progress_begin(0, self.files_total)
+            self.timer = wm.event_timer_add(0.01, window=context.window)
+            wm.modal_handler_add(self)
+            return {'RUNNING_MODAL'}
+
+        def modal(self, context, event):
+            if event.type == 'ESC':
+                self.steps.close()
+                self.finish(context)
+                self.report({'WARNING'}, "import cancelled, " + str(self.files_done) + " of " + str(self.files_total) + " files done")
+                return {'CANCELLED'}
+            if event.type != 'TIMER': return {'PASS_THROUGH'}
+
+            # work in small slices so the ui stays responsive
+            deadline = time.perf_counter() + 0.1
+            try:
+                progress = next(self.steps)
+                while time.perf_counter() < deadline:
+                    progress = next(self.steps)
+            except StopIteration:
+                self.finish(context)
+                return {'FINISHED'}
+            except Exception:
+                self.steps.close()
+                self.finish(context)
+                raise
+            context.window_manager.progress_update(progress)
+            context.workspace.status_text_set("Importing " + str(self.files_done+1) + "/" + str(self.files_total) + ", Esc to cancel")
+            return {'RUNNING_MODAL'}
+
+        def finish(self, context):
+            wm = context.window_manager
+            wm.event_timer_remove(self.timer)
+            wm.progress_end()
+            context.workspace.status_text_set(None)
+            self.report_profiles()
+    # Only needed if you want to add into a dynamic menu.
+    def menu_func_import(self, context):
+        self.layout.operator(ImportSomeData.bl_idname, text="Hydro Thunder Import")
+    # Register and add to the "file selector" menu (required to use F3 search "Text Import Operator" for quick access).
+    def register():
+        bpy.utils.register_class(ImportPartItem)
+        bpy.utils.register_class(IMPORT_UL_hydro_thunder_parts)
+        bpy.utils.register_class(ImportSomeData)
+        bpy.types.TOPBAR_MT_file_import.append(menu_func_import)
+    def unregister():
+        bpy.utils.unregister_class(ImportSomeData)
+        bpy.utils.unregister_class(IMPORT_UL_hydro_thunder_parts)
+        bpy.utils.unregister_class(ImportPartItem)
+        bpy.types.TOPBAR_MT_file_import.remove(menu_func_import)
+
 if __name__ == "__main__":
+    if bpy is None:
+        sys.exit(convert_main(sys.argv[1:]))
     register()
 
     # test call
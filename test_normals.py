@@ -0,0 +1,47 @@
+# checks the vectorized normal decoder against the per value formula it replaced
+# run with: python -m pytest test_normals.py
+
+import math
+
+import numpy as np
+
+import benchmark
+
+importer = benchmark.load_importer(with_bpy_stub=False)
+
+# packed angles worth checking on their own: both ends, and either side of the middle where the angle crosses zero
+edge_values = [0, 0xFFFFFFFF, 0x7FFFFFFF, 0x80000000, 1, 0xFFFFFFFE, 0x40000000, 0xC0000000]
+
+def scalar_angle(value):
+    return (((value / 4294967295.0) * 2.0) - 1.0) * (math.pi*2)
+
+def scalar_normal(raw_x, raw_y):
+    n_x = scalar_angle(raw_x)
+    n_y = scalar_angle(raw_y)
+    return (math.cos(n_y)*math.cos(n_x), math.sin(n_y)*math.cos(n_x), math.sin(n_x))
+
+def check(raw_x, raw_y):
+    raw_x = np.array(raw_x, dtype='>u4')
+    raw_y = np.array(raw_y, dtype='>u4')
+    normals = importer.decode_normals(raw_x, raw_y)
+    assert normals.shape == (len(raw_x), 3)
+    assert normals.dtype == np.float32
+    expected = np.array([scalar_normal(int(x), int(y)) for x, y in zip(raw_x, raw_y)])
+    assert np.allclose(normals, expected, rtol=0, atol=1e-6)
+
+def test_random_values():
+    rng = np.random.default_rng(7)
+    check(rng.integers(0, 2**32, 10000, dtype=np.uint64), rng.integers(0, 2**32, 10000, dtype=np.uint64))
+
+def test_edge_values():
+    # every edge value paired with every other one, for both angles
+    raw_x, raw_y = np.meshgrid(edge_values, edge_values)
+    check(raw_x.ravel(), raw_y.ravel())
+
+def test_unit_length():
+    rng = np.random.default_rng(11)
+    normals = importer.decode_normals(rng.integers(0, 2**32, 1000, dtype=np.uint64).astype('>u4'), rng.integers(0, 2**32, 1000, dtype=np.uint64).astype('>u4'))
+    assert np.allclose(np.linalg.norm(normals, axis=1), 1.0, atol=1e-6)
+
+def test_empty():
+    assert importer.decode_normals(np.zeros(0, dtype='>u4'), np.zeros(0, dtype='>u4')).shape == (0, 3)